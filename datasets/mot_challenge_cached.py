@@ -0,0 +1,41 @@
+_base_ = ['./mot_challenge.py']
+# Training frames come from the cache written by tools/frame_cache.py instead of
+# decoding the JPEGs under data_root; the cache also holds the annotation file
+# with boxes rescaled to the cached frames. The tools directory is on sys.path
+# when the scripts in tools/ are run.
+custom_imports = dict(imports=['frame_cache'], allow_failed_imports=False)
+frame_cache_dir = 'E:/internship_project/mmtracking-master/mmtracking-master/intership-project/frame_cache/train'
+img_norm_cfg = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+train_pipeline = [
+    dict(type='LoadMultiImagesFromCache', cache_dir=frame_cache_dir, to_float32=True),
+    dict(type='SeqLoadAnnotations', with_bbox=True, with_track=True),
+    dict(
+        type='SeqResize',
+        img_scale=(800, 800),
+        share_params=True,
+        ratio_range=(0.8, 1.2),
+        keep_ratio=True,
+        bbox_clip_border=False),
+    dict(type='SeqPhotoMetricDistortion', share_params=True),
+    dict(
+        type='SeqRandomCrop',
+        share_params=False,
+        crop_size=(1088, 1088),
+        bbox_clip_border=False),
+    dict(type='SeqRandomFlip', share_params=True, flip_ratio=0.5),
+    dict(type='SeqNormalize', **img_norm_cfg),
+    dict(type='SeqPad', size_divisor=32),
+    dict(type='MatchInstances', skip_nomatch=True),
+    dict(
+        type='VideoCollect',
+        keys=[
+            'img', 'gt_bboxes', 'gt_labels', 'gt_match_indices',
+            'gt_instance_ids'
+        ]),
+    dict(type='SeqDefaultFormatBundle', ref_prefix='ref')
+]
+data = dict(
+    train=dict(
+        ann_file=frame_cache_dir + '/annotations.json',
+        pipeline=train_pipeline))
@@ -0,0 +1,44 @@
+_base_ = ['./mot_challenge_reid.py']
+# ReID crops come from the shards written by tools/generateToReid.py --shards
+# instead of one JPEG per crop. The tools directory is on sys.path when the
+# scripts in tools/ are run.
+custom_imports = dict(imports=['reid_shards'], allow_failed_imports=False)
+img_norm_cfg = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+# the crops are stored at 128x256, so the resizes below leave them unchanged
+train_pipeline = [
+    dict(type='LoadMultiImagesFromShards', to_float32=True),
+    dict(
+        type='SeqResize',
+        img_scale=(128, 256),
+        share_params=False,
+        keep_ratio=False,
+        bbox_clip_border=False,
+        override=False),
+    dict(
+        type='SeqRandomFlip',
+        share_params=False,
+        flip_ratio=0.5,
+        direction='horizontal'),
+    dict(type='SeqNormalize', **img_norm_cfg),
+    dict(type='VideoCollect', keys=['img', 'gt_label']),
+    dict(type='ReIDFormatBundle')
+]
+test_pipeline = [
+    dict(type='LoadImageFromShards'),
+    dict(type='Resize', img_scale=(128, 256), keep_ratio=False),
+    dict(type='Normalize', **img_norm_cfg),
+    dict(type='ImageToTensor', keys=['img']),
+    dict(type='Collect', keys=['img'], meta_keys=[])
+]
+data_root = 'E:/internship_project/mmtracking-master/mmtracking-master/intership-project/'
+data = dict(
+    train=dict(
+        data_prefix=data_root + 'reid/shards',
+        pipeline=train_pipeline),
+    val=dict(
+        data_prefix=data_root + 'reid/shards',
+        pipeline=test_pipeline),
+    test=dict(
+        data_prefix=data_root + 'reid/shards',
+        pipeline=test_pipeline))
@@ -0,0 +1,9 @@
+_base_ = ['./deepsort_faster-rcnn_fpn_4e_mot17-private-half.py']
+# GatedSortTracker lives in tools/gated_sort_tracker.py; the tools directory is on
+# sys.path when the scripts in tools/ are run.
+custom_imports = dict(imports=['gated_sort_tracker'], allow_failed_imports=False)
+model = dict(
+    tracker=dict(
+        type='GatedSortTracker',
+        # detections overlapping exactly one confirmed track this much skip ReID
+        gate_iou_thr=0.5))
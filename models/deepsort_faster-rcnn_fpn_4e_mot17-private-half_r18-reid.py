@@ -0,0 +1,7 @@
+_base_ = ['./deepsort_faster-rcnn_fpn_4e_mot17-private-half.py']
+# Tracks with a ReID trained from resnet18_b32x8_MOT17.py; pass its checkpoint
+# as --reid-checkpoint.
+model = dict(
+    reid=dict(
+        backbone=dict(depth=18),
+        head=dict(in_channels=512, fc_channels=256)))
@@ -0,0 +1,12 @@
+_base_ = ['./resnet50_b32x8_MOT17.py']
+# Same ReIDDataset pipeline and schedule as the ResNet-50 ReID, with a ResNet-18
+# backbone (512-d pooled features) and a smaller fc layer.
+model = dict(
+    reid=dict(
+        backbone=dict(depth=18),
+        head=dict(in_channels=512, fc_channels=256),
+        init_cfg=dict(
+            type='Pretrained',
+            checkpoint=  # noqa: E251
+            'https://download.openmmlab.com/mmclassification/v0/resnet/resnet18_batch256_imagenet_20200708-34ab8f90.pth'  # noqa: E501
+        )))
@@ -1,7 +1,9 @@
 import os
 import cv2
-import pandas as pd
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import annotation_store
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Segment a video and annotations into smaller clips.")
@@ -9,58 +11,87 @@ def parse_args():
     parser.add_argument('--video-file', required=True, help="Path to the input video file.")
     parser.add_argument('--output-dir', required=True, help="Directory to store the output segments.")
     parser.add_argument('--segment-duration', type=int, default=10, help="Duration of each segment in seconds.")
-    parser.add_argument('--fps', type=int, default=30, help="Frames per second of the video.")
+    parser.add_argument('--fps', type=int, default=30, help="Frames per second of the video, used when the stream does not report it.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of threads encoding JPEG frames.")
     return parser.parse_args()
 
-def create_segments(txt_file, video_file, output_dir, segment_duration=10, fps=30):
-    cap = cv2.VideoCapture(video_file)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    total_duration = frame_count / fps
-
-    df = pd.read_csv(txt_file)
+def write_seqinfo(segment_output_dir, name, fps, seq_length, width, height):
+    seqinfo_path = os.path.join(segment_output_dir, "seqinfo.ini")
+    with open(seqinfo_path, "w") as seqinfo_file:
+        seqinfo_file.write("[Sequence]\n")
+        seqinfo_file.write(f"name={name}\n")
+        seqinfo_file.write("imDir=img\n")
+        seqinfo_file.write(f"frameRate={fps}\n")
+        seqinfo_file.write(f"seqLength={seq_length}\n")
+        seqinfo_file.write(f"imWidth={width}\n")
+        seqinfo_file.write(f"imHeight={height}\n")
+        seqinfo_file.write("imExt=.jpg\n")
 
-    segment_frames = segment_duration * fps
-    num_segments = int(total_duration / segment_duration)
+def write_frame(path, frame):
+    if not cv2.imwrite(path, frame):
+        raise IOError(f'Could not write frame to {path}')
 
-    for segment_index in range(num_segments):
-        start_time = segment_index * segment_duration
-        end_time = start_time + segment_duration
-        segment_data = df[(df['time'] >= start_time) & (df['time'] < end_time)].copy()
+def create_segments(txt_file, video_file, output_dir, segment_duration=10, fps=30, workers=None):
+    cap = cv2.VideoCapture(video_file)
+    if not cap.isOpened():
+        raise IOError(f'Could not open video file: {video_file}')
+    stream_fps = cap.get(cv2.CAP_PROP_FPS)
+    if stream_fps > 0:
+        fps = stream_fps
+    segment_frames = max(int(round(segment_duration * fps)), 1)
 
-        segment_data['frame_index'] = segment_data['frame_index'] - segment_data['frame_index'].min() + 1
+    # frame_index is 1-based and frame n of the video belongs to segment
+    # (n - 1) // segment_frames; each segment reads its frame range as a slice.
+    store = annotation_store.load(txt_file)
 
+    def finish_segment(segment_index, seq_length, width, height):
         segment_output_dir = os.path.join(output_dir, f"segment_{segment_index+1}")
-        img_output_dir = os.path.join(segment_output_dir, "img")
-        segment_gt_dir = os.path.join(segment_output_dir, 'gt')
-        os.makedirs(img_output_dir, exist_ok=True)
-        os.makedirs(segment_gt_dir, exist_ok=True)
+        first_frame = segment_index * segment_frames
+        segment_data = store.frames(first_frame + 1, first_frame + segment_frames + 1).copy()
+        segment_data['frame'] -= first_frame
 
-        segment_txt_path = os.path.join(segment_gt_dir, "gt.txt")
-        segment_data.to_csv(segment_txt_path, index=False, header=False)
+        segment_txt_path = os.path.join(segment_output_dir, 'gt', "gt.txt")
+        with open(segment_txt_path, 'w') as f:
+            f.writelines(annotation_store.format_rows(segment_data, store.has_time, store.int_columns))
+        write_seqinfo(segment_output_dir, f"segment_{segment_index+1}", int(round(fps)), seq_length, width, height)
 
-        seqinfo_path = os.path.join(segment_output_dir, "seqinfo.ini")
-        with open(seqinfo_path, "w") as seqinfo_file:
-            seqinfo_file.write("[Sequence]\n")
-            seqinfo_file.write(f"name=segment_{segment_index+1}\n")
-            seqinfo_file.write("imDir=img\n")
-            seqinfo_file.write(f"frameRate={fps}\n")
-            seqinfo_file.write(f"seqLength={segment_frames}\n")
-            seqinfo_file.write("imWidth=1280\n")
-            seqinfo_file.write("imHeight=720\n")
-            seqinfo_file.write("imExt=.jpg\n")
-
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_time * fps)
-        for frame_index in range(1, segment_frames + 1):
+    # A single sequential decode pass; JPEG encoding is fanned out to a thread
+    # pool and the number of frames in flight is bounded to keep memory flat.
+    max_in_flight = 4 * (workers or os.cpu_count() or 1)
+    in_flight = deque()
+    segment_index = -1
+    frame_index = 0
+    width = height = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
             ret, frame = cap.read()
             if not ret:
                 break
+            height, width = frame.shape[:2]
+
+            if frame_index // segment_frames != segment_index:
+                if segment_index >= 0:
+                    finish_segment(segment_index, segment_frames, width, height)
+                segment_index = frame_index // segment_frames
+                img_output_dir = os.path.join(output_dir, f"segment_{segment_index+1}", "img")
+                os.makedirs(img_output_dir, exist_ok=True)
+                os.makedirs(os.path.join(output_dir, f"segment_{segment_index+1}", 'gt'), exist_ok=True)
+
+            output_frame_name = os.path.join(img_output_dir, f"{frame_index % segment_frames + 1:06d}.jpg")
+            in_flight.append(pool.submit(write_frame, output_frame_name, frame))
+            if len(in_flight) >= max_in_flight:
+                in_flight.popleft().result()
+            frame_index += 1
 
-            output_frame_name = os.path.join(img_output_dir, f"{frame_index:06d}.jpg")
-            cv2.imwrite(output_frame_name, frame)
+        # the trailing segment may be shorter than segment_frames
+        if segment_index >= 0:
+            finish_segment(segment_index, frame_index - segment_index * segment_frames, width, height)
+        for future in in_flight:
+            future.result()
 
     cap.release()
     print("Processing complete.")
 
 if __name__ == '__main__':
     args = parse_args()
-    create_segments(args.txt_file, args.video_file, args.output_dir, args.segment_duration, args.fps)
+    create_segments(args.txt_file, args.video_file, args.output_dir, args.segment_duration, args.fps, args.workers)
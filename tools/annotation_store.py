@@ -0,0 +1,174 @@
+import argparse
+import os
+import os.path as osp
+
+import numpy as np
+import pandas as pd
+
+# One row per box, in the column order of gt.txt / output.txt. The 9th column
+# (time) only exists in files produced by convertToTxt.py / VideoToSegments.py.
+ANNOTATION_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('track_id', '<i8'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('w', '<f8'),
+    ('h', '<f8'),
+    ('score', '<f8'),
+    ('category', '<i8'),
+    ('time', '<f8'),
+])
+STORE_SUFFIX = '.ann'
+
+
+def store_path(txt_path):
+    return osp.splitext(txt_path)[0] + STORE_SUFFIX
+
+
+def _offsets(keys, num_keys):
+    # offsets[k]:offsets[k + 1] is the run of rows whose (sorted) key is k
+    return np.searchsorted(keys, np.arange(num_keys + 1), side='left').astype(np.int64)
+
+
+# Annotations of one sequence as NumPy structured arrays. `rows` is sorted by
+# frame and `by_track` by (track_id, frame), both stably, with offset indexes
+# so that frame ranges and single tracks are contiguous slices. Stores opened
+# from disk are memory-mapped and slices are views into the files.
+# `int_columns` names the columns the text file held as integers, so that
+# format_rows writes them back the way pandas would.
+class AnnotationStore:
+    def __init__(self, rows, by_track, frame_offsets, track_ids, track_offsets, has_time, int_columns=None):
+        self.rows = rows
+        self.by_track = by_track
+        self.frame_offsets = frame_offsets
+        self.track_ids = track_ids
+        self.track_offsets = track_offsets
+        self.has_time = has_time
+        if int_columns is None:
+            int_columns = tuple(name for name in ANNOTATION_DTYPE.names if ANNOTATION_DTYPE[name].kind == 'i')
+        self.int_columns = tuple(int_columns)
+
+    @classmethod
+    def from_rows(cls, rows, has_time=True, int_columns=None):
+        rows = np.asarray(rows, dtype=ANNOTATION_DTYPE)
+        rows = rows[np.argsort(rows['frame'], kind='stable')]
+        by_track = rows[np.argsort(rows['track_id'], kind='stable')]
+        num_frames = int(rows['frame'].max()) + 1 if len(rows) else 0
+        frame_offsets = _offsets(rows['frame'], num_frames)
+        track_ids, track_starts = np.unique(by_track['track_id'], return_index=True)
+        track_offsets = np.append(track_starts, len(by_track)).astype(np.int64)
+        return cls(rows, by_track, frame_offsets, track_ids, track_offsets, has_time, int_columns)
+
+    @classmethod
+    def from_text(cls, txt_path):
+        with open(txt_path, 'r') as f:
+            first_line = f.readline().strip()
+        has_header = bool(first_line) and not first_line[0].isdigit()
+        try:
+            frame = pd.read_csv(txt_path, header=None, skiprows=1 if has_header else 0)
+        except pd.errors.EmptyDataError:
+            frame = pd.DataFrame(np.zeros((0, len(ANNOTATION_DTYPE.names)), dtype=np.float64))
+        data = frame.to_numpy(dtype=np.float64)
+        # the dtypes pandas inferred, e.g. a column written as 1.0 stays float
+        int_columns = [name for name, dtype in zip(ANNOTATION_DTYPE.names, frame.dtypes) if dtype.kind in 'iu']
+        rows = np.zeros(len(data), dtype=ANNOTATION_DTYPE)
+        for i, name in enumerate(ANNOTATION_DTYPE.names[:data.shape[1]]):
+            rows[name] = data[:, i]
+        if data.shape[1] < len(ANNOTATION_DTYPE.names):
+            rows['time'] = np.nan
+        return cls.from_rows(rows, has_time=data.shape[1] >= len(ANNOTATION_DTYPE.names), int_columns=int_columns)
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        mode = 'r' if mmap else None
+        load = lambda name: np.load(osp.join(path, f'{name}.npy'), mmap_mode=mode)
+        # meta: has_time, then one integer flag per column (absent in older stores)
+        meta = load('meta')
+        int_columns = [name for name, flag in zip(ANNOTATION_DTYPE.names, meta[1:]) if flag] if len(meta) > 1 else None
+        return cls(load('rows'), load('by_track'), load('frame_offsets'), load('track_ids'),
+                   load('track_offsets'), bool(meta[0]), int_columns)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(osp.join(path, 'rows.npy'), self.rows)
+        np.save(osp.join(path, 'by_track.npy'), self.by_track)
+        np.save(osp.join(path, 'frame_offsets.npy'), self.frame_offsets)
+        np.save(osp.join(path, 'track_ids.npy'), self.track_ids)
+        np.save(osp.join(path, 'track_offsets.npy'), self.track_offsets)
+        int_flags = [name in self.int_columns for name in ANNOTATION_DTYPE.names]
+        np.save(osp.join(path, 'meta.npy'), np.array([self.has_time] + int_flags, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def max_frame(self):
+        return len(self.frame_offsets) - 2
+
+    def frames(self, start, stop):
+        # rows with start <= frame < stop
+        start = min(max(start, 0), len(self.frame_offsets) - 1)
+        stop = min(max(stop, start), len(self.frame_offsets) - 1)
+        return self.rows[self.frame_offsets[start]:self.frame_offsets[stop]]
+
+    def frame(self, frame):
+        return self.frames(frame, frame + 1)
+
+    def track(self, track_id):
+        k = np.searchsorted(self.track_ids, track_id)
+        if k >= len(self.track_ids) or self.track_ids[k] != track_id:
+            return self.by_track[:0]
+        return self.by_track[self.track_offsets[k]:self.track_offsets[k + 1]]
+
+
+def format_rows(rows, has_time=True, int_columns=None):
+    # Text rows as pandas.to_csv writes them: integer columns as integers, float
+    # columns as the shortest float repr (whole numbers keep their .0). The
+    # column types default to those of ANNOTATION_DTYPE; pass the store's
+    # int_columns to reproduce the file it was read from.
+    names = ANNOTATION_DTYPE.names if has_time else ANNOTATION_DTYPE.names[:-1]
+    if int_columns is None:
+        int_columns = [name for name in names if ANNOTATION_DTYPE[name].kind == 'i']
+    columns = []
+    for name in names:
+        column = rows[name].astype(np.int64 if name in int_columns else np.float64)
+        columns.append([repr(value) for value in column.tolist()])
+    return [','.join(fields) + '\n' for fields in zip(*columns)]
+
+
+def build(txt_path, out_path=None):
+    out_path = out_path or store_path(txt_path)
+    AnnotationStore.from_text(txt_path).save(out_path)
+    return out_path
+
+
+def load(txt_path):
+    # Prefer the memory-mapped store next to the text file when it is up to date.
+    # Stores without column types cannot reproduce the text, so they count as outdated.
+    path = store_path(txt_path)
+    if osp.isdir(path) and (not osp.exists(txt_path) or osp.getmtime(path) >= osp.getmtime(txt_path)):
+        if not osp.exists(txt_path) or len(np.load(osp.join(path, 'meta.npy'))) > 1:
+            return AnnotationStore.open(path)
+    return AnnotationStore.from_text(txt_path)
+
+
+def find_annotation_files(path):
+    if osp.isfile(path):
+        return [path]
+    found = []
+    for root, _, files in os.walk(path):
+        found.extend(osp.join(root, f) for f in files if f in ('gt.txt', 'output.txt'))
+    return sorted(found)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build memory-mapped annotation stores next to gt.txt / output.txt files.')
+    parser.add_argument('paths', nargs='+', help='Annotation text files, or directories searched for gt.txt and output.txt.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    for path in args.paths:
+        for txt_path in find_annotation_files(path):
+            print(f'{txt_path} -> {build(txt_path)}')
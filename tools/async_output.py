@@ -0,0 +1,134 @@
+import csv
+import json
+import queue
+import threading
+import time
+
+import cv2
+
+LOG_FORMATS = ('text', 'jsonl', 'csv')
+
+_END = object()
+
+
+def format_text(record):
+    # The line format process_log.txt has always used.
+    real_time = time.strftime("%H:%M:%S", time.gmtime(record['time']))
+    labels = {k: v for k, v in record.items() if k not in ('frame', 'time')}
+    return f"Frame: {record['frame']}, Time: {real_time}, Labels: {labels}"
+
+
+# Writes flat dict records to a log file from a background thread. A record is
+# only emitted when its values (other than frame/time) changed or `every`
+# frames have passed since the last one, and lines are flushed in batches.
+class RecordLogger(threading.Thread):
+    def __init__(self, path, fmt='jsonl', every=1, flush_every=100, flush_interval=1.0,
+                 echo=False, max_queue=4096):
+        super().__init__(daemon=True)
+        if fmt not in LOG_FORMATS:
+            raise ValueError(f'fmt must be one of {LOG_FORMATS}, got {fmt!r}')
+        self.path = path
+        self.fmt = fmt
+        self.every = max(int(every), 1)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.echo = echo
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._last_values = None
+        self._last_frame = None
+        self.start()
+
+    def update(self, record):
+        values = tuple(v for k, v in record.items() if k not in ('frame', 'time'))
+        frame = record['frame']
+        if (values == self._last_values and self._last_frame is not None
+                and frame - self._last_frame < self.every):
+            return False
+        self._last_values = values
+        self._last_frame = frame
+        self.log(record)
+        return True
+
+    def log(self, record):
+        # Never block the caller: if the writer falls behind, count and drop.
+        try:
+            self.queue.put_nowait(dict(record))
+        except queue.Full:
+            self.dropped += 1
+
+    def _format(self, record, csv_writer):
+        if self.fmt == 'text':
+            return format_text(record) + '\n'
+        if self.fmt == 'jsonl':
+            return json.dumps(record, separators=(',', ':')) + '\n'
+        csv_writer.writerow(record)
+        return None
+
+    def run(self):
+        with open(self.path, 'w', newline='') as f:
+            csv_writer = None
+            pending = 0
+            last_flush = time.time()
+            while True:
+                try:
+                    record = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    record = None
+                if record is _END:
+                    break
+                if record is not None:
+                    if self.fmt == 'csv' and csv_writer is None:
+                        csv_writer = csv.DictWriter(f, fieldnames=list(record), extrasaction='ignore')
+                        csv_writer.writeheader()
+                    line = self._format(record, csv_writer)
+                    if line is not None:
+                        f.write(line)
+                    if self.echo:
+                        print(format_text(record))
+                    pending += 1
+                if pending and (pending >= self.flush_every or time.time() - last_flush >= self.flush_interval):
+                    f.flush()
+                    pending = 0
+                    last_flush = time.time()
+
+    def close(self):
+        self.queue.put(_END)
+        self.join()
+
+
+# Shows frames in an OpenCV window from a background thread. Only the newest
+# frame is kept, so a slow display drops frames instead of stalling inference.
+class AsyncDisplay(threading.Thread):
+    def __init__(self, window_name):
+        super().__init__(daemon=True)
+        self.window_name = window_name
+        self.queue = queue.Queue(maxsize=1)
+        self.dropped = 0
+        self.quit_requested = threading.Event()
+        self.start()
+
+    def show(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(frame)
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is _END:
+                break
+            cv2.imshow(self.window_name, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                self.quit_requested.set()
+        cv2.destroyAllWindows()
+
+    def close(self):
+        self.show(_END)
+        self.join()
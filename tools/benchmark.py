@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import os.path as osp
+import platform
+import sys
+import tempfile
+import time
+import cv2
+import mmcv
+import numpy as np
+import torch
+from mmtrack.apis import init_model
+from inference_backend import apply_backend
+from model_loader import BACKENDS, load_artifact
+from mot_inference import build_test_pipeline, detect_batch, prepare_batch, track_frame
+from roi import add_roi_args, parse_roi
+from stage_timer import StageTimer
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure per-stage latency of the tracking pipeline and compare it to a baseline.')
+    parser.add_argument('--config', help='Path to the MOT model configuration file.')
+    parser.add_argument('--detector-checkpoint', help='Path to the detector model checkpoint. Defaults to the one in the config.')
+    parser.add_argument('--reid-checkpoint', help='Path to the re-identification model checkpoint. Defaults to the one in the config.')
+    parser.add_argument('--artifact', help='Model artifact written by tools/export_model.py. Replaces the config and checkpoints.')
+    parser.add_argument('--backend', choices=BACKENDS, default='pytorch', help='Runtime for the detector backbone/FPN and the ReID network.')
+    parser.add_argument('--backend-dir', help='Directory with the networks exported by tools/export_backend.py.')
+    parser.add_argument('--video', help='Video to run on. A synthetic video is generated when omitted.')
+    parser.add_argument('--num-frames', type=int, default=100, help='Number of measured frames.')
+    parser.add_argument('--warmup', type=int, default=5, help='Number of frames run before measuring.')
+    parser.add_argument('--width', type=int, default=1280, help='Width of the synthetic video.')
+    parser.add_argument('--height', type=int, default=720, help='Height of the synthetic video.')
+    add_roi_args(parser)
+    parser.add_argument('--device', default='cpu', help='Device to use for computation.')
+    parser.add_argument('--threads', type=int, help='Number of torch CPU threads.')
+    parser.add_argument('--out', help='Write the JSON report to this file instead of stdout.')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare against.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline instead of comparing against it.')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown of a stage p50 (or FPS drop) counted as a regression.')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore p50 slowdowns smaller than this many milliseconds.')
+    return parser.parse_args()
+
+def make_synthetic_video(path, num_frames, width, height, fps=30):
+    # Boxes of a few sizes moving across a textured background, so the detector
+    # and tracker see a stable, repeatable workload.
+    rng = np.random.RandomState(0)
+    background = rng.randint(80, 176, size=(height, width, 3), dtype=np.uint8)
+    boxes = [(rng.randint(0, width), rng.randint(0, height), rng.randint(60, 200), rng.randint(60, 200),
+              rng.randint(-12, 13), rng.randint(-12, 13), tuple(int(c) for c in rng.randint(0, 256, 3)))
+             for _ in range(8)]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(num_frames):
+        frame = background.copy()
+        for x, y, w, h, vx, vy, color in boxes:
+            x0, y0 = (x + vx * i) % width, (y + vy * i) % height
+            cv2.rectangle(frame, (x0, y0), (x0 + w, y0 + h), color, -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def run_benchmark(model, video, num_frames, warmup, out_dir, sync=None, roi=None):
+    timer = StageTimer(sync=sync)
+    # ReID crops and forwards happen inside tracker.track; time them separately
+    timer.wrap(model.tracker, 'crop_imgs', 'reid')
+    timer.wrap(model.reid, 'simple_test', 'reid')
+    pipeline = None
+
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise IOError(f'Could not open video file: {video}')
+    writer = None
+    frame_id = 0
+    start_time = None
+    while frame_id < warmup + num_frames:
+        if frame_id == warmup:
+            timer.reset()
+            start_time = time.perf_counter()
+        with timer.stage('decode'):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        with timer.stage('preprocess'):
+            if pipeline is None:
+                # the ROI resize depends on the frame size
+                if roi is not None:
+                    roi.fit(model.cfg, frame.shape)
+                pipeline = build_test_pipeline(model.cfg)
+            inputs = roi.crop(frame) if roi is not None else frame
+            img, img_metas = prepare_batch(model, pipeline, [inputs], [frame_id])
+        with timer.stage('detector'):
+            feats, det_bboxes, det_labels = detect_batch(model, img, img_metas)
+        with timer.stage('tracker'):
+            result = track_frame(model, img, img_metas, feats, det_bboxes[0], det_labels[0], frame_id)
+            if roi is not None:
+                result = roi.to_frame(result)
+        with timer.stage('render'):
+            rendered = model.show_result(frame, result, show=False)
+        with timer.stage('encode'):
+            if writer is None:
+                writer = cv2.VideoWriter(osp.join(out_dir, 'benchmark.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), 30,
+                                         (rendered.shape[1], rendered.shape[0]))
+            writer.write(rendered)
+        timer.end_frame()
+        frame_id += 1
+    elapsed = time.perf_counter() - start_time if start_time is not None else 0.0
+    cap.release()
+    if writer is not None:
+        writer.release()
+
+    measured = max(frame_id - warmup, 0)
+    if measured == 0:
+        raise ValueError(f'{video} has no frames left after {warmup} warm-up frames')
+    return dict(frames=measured, fps=round(measured / max(elapsed, 1e-9), 3), stages=timer.summary())
+
+def compare_to_baseline(report, baseline, threshold, min_delta_ms):
+    regressions = []
+    for name, stats in report['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        delta = stats['p50_ms'] - base['p50_ms']
+        if delta > min_delta_ms and stats['p50_ms'] > base['p50_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p50 {base['p50_ms']:.2f}ms -> {stats['p50_ms']:.2f}ms")
+    if report['fps'] < baseline['fps'] * (1 - threshold):
+        regressions.append(f"fps: {baseline['fps']:.2f} -> {report['fps']:.2f}")
+    return regressions
+
+def main():
+    args = parse_args()
+    if args.save_baseline and not args.baseline:
+        raise ValueError('--save-baseline needs --baseline to know where to store the report')
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.artifact:
+        # the benchmark runs its own warm-up frames
+        model = load_artifact(args.artifact, device=args.device, warmup=False)
+    elif args.config:
+        cfg = mmcv.Config.fromfile(args.config)
+        if args.detector_checkpoint:
+            cfg.model.detector.init_cfg.checkpoint = args.detector_checkpoint
+        if args.reid_checkpoint:
+            cfg.model.reid.init_cfg.checkpoint = args.reid_checkpoint
+        model = init_model(cfg, device=args.device)
+    else:
+        raise ValueError('Either --config or --artifact is required')
+    apply_backend(model, args.backend, args.backend_dir)
+    sync = torch.cuda.synchronize if args.device.startswith('cuda') else None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video = args.video or make_synthetic_video(
+            osp.join(tmp_dir, 'synthetic.mp4'), args.warmup + args.num_frames, args.width, args.height)
+        report = run_benchmark(model, video, args.num_frames, args.warmup, tmp_dir, sync, parse_roi(args.roi, args.roi_polygon))
+
+    report = dict(
+        config=args.artifact or args.config,
+        video=args.video or f'synthetic {args.width}x{args.height}',
+        device=args.device,
+        backend=args.backend,
+        roi=dict(rect=args.roi, polygon=args.roi_polygon) if args.roi or args.roi_polygon else None,
+        torch_threads=torch.get_num_threads(),
+        torch_version=torch.__version__,
+        platform=platform.platform(),
+        **report)
+
+    regressions = []
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold, args.min_delta_ms)
+        report['regressions'] = regressions
+
+    if args.out:
+        os.makedirs(osp.dirname(osp.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if regressions:
+        print('Regressions against the baseline:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,9 @@ import os
 import os.path as osp
 import json
 import argparse
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import annotation_store
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Generate dataset structure for object detection and tracking.")
@@ -11,106 +13,134 @@ def parse_args():
     parser.add_argument('--width', type=int, default=1280, help='Width of the video frames.')
     parser.add_argument('--height', type=int, default=720, help='Height of the video frames.')
     parser.add_argument('--split-data', type=bool,default=False, help='Whether to split data into training and testing based on file naming.')
+    parser.add_argument('--split-manifest', help='File listing the test video names (one per line, or a JSON list). Overrides --split-data.')
+    parser.add_argument('--out-dir', default='.', help='Directory to write train_dataset.json and test_dataset.json to.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes parsing gt.txt files.')
     return parser.parse_args()
 
-def generate_dataset_structure(base_path, fps=30, width=1280, height=720, split_data=False):
+def load_split_manifest(path):
+    with open(path, 'r') as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        return set(json.loads(content))
+    return {line.strip() for line in content.splitlines() if line.strip()}
+
+def parse_gt_file(txt_file_path):
+    rows = annotation_store.load(txt_file_path).rows
+    return dict(
+        frame_ids=np.array(rows['frame']),
+        instance_ids=np.array(rows['track_id']),
+        bboxes=np.column_stack([rows['x'], rows['y'], rows['w'], rows['h']]),
+        confs=np.array(rows['score']))
+
+def iter_images(video, width, height):
+    for image_id, frame_id in zip(video['image_ids'], video['image_frame_ids']):
+        yield {
+            "id": image_id,
+            "video_id": video['video_id'],
+            "file_name": osp.join(video['name'], 'img', f"{frame_id:06d}.jpg").replace("\\", "/"),
+            "height": height,
+            "width": width,
+            "frame_id": frame_id - 1,
+            "mot_frame_id": frame_id
+        }
+
+def iter_annotations(video):
+    gt = video['gt']
+    rows = zip(video['annotation_ids'], video['annotation_image_ids'], gt['instance_ids'].tolist(),
+               gt['bboxes'].tolist(), gt['confs'].tolist())
+    for annotation_id, image_id, instance_id, bbox, conf in rows:
+        yield {
+            "id": annotation_id,
+            "image_id": image_id,
+            "category_id": 1,
+            "instance_id": instance_id,
+            "bbox": bbox,
+            "area": bbox[2] * bbox[3],
+            "iscrowd": False,
+            "visibility": 1.0,
+            "mot_instance_id": instance_id,
+            "mot_conf": conf,
+            "mot_class_id": 1
+        }
+
+def write_json_array(f, items):
+    first = True
+    for item in items:
+        if not first:
+            f.write(',')
+        f.write(json.dumps(item, separators=(',', ':')))
+        first = False
+
+def write_dataset(path, category_info, videos, width, height):
+    # Streams the dataset to disk in compact form instead of building one dict.
+    num_images = sum(len(video['image_ids']) for video in videos)
+    with open(path, 'w') as f:
+        f.write('{"categories":' + json.dumps([category_info], separators=(',', ':')))
+        f.write(',"annotations":[')
+        write_json_array(f, (annotation for video in videos for annotation in iter_annotations(video)))
+        f.write('],"images":[')
+        write_json_array(f, (image for video in videos for image in iter_images(video, width, height)))
+        f.write('],"videos":[')
+        write_json_array(f, (video['info'] for video in videos))
+        f.write(f'],"num_instances":{num_images}}}')
+
+def generate_dataset_structure(base_path, fps=30, width=1280, height=720, split_data=False,
+                               split_manifest=None, out_dir='.', workers=None):
     category_info = {"id": 1, "name": "coconat"}
+    test_names = load_split_manifest(split_manifest) if split_manifest else None
 
-    train_dataset = {
-        "categories": [category_info],
-        "annotations": [],
-        "images": [],
-        "videos": [],
-        "num_instances": 0
-    }
-
-    test_dataset = {
-        "categories": [category_info],
-        "annotations": [],
-        "images": [],
-        "videos": [],
-        "num_instances": 0
-    }
-
-    video_id = 0
-    image_id = 0
-    annotation_id = 0
-
-    for video_name in os.listdir(base_path):
+    video_names = []
+    txt_file_paths = []
+    for video_name in sorted(os.listdir(base_path)):
         video_path = osp.join(base_path, video_name)
-        img_folder = osp.join(video_path, 'img')
         txt_file_path = osp.join(video_path, 'gt/gt.txt')
+        if os.path.isdir(osp.join(video_path, 'img')) and osp.exists(txt_file_path):
+            video_names.append(video_name)
+            txt_file_paths.append(txt_file_path)
 
-        if os.path.isdir(img_folder) and osp.exists(txt_file_path):
-            video_id += 1
-            video_info = {
-                "id": video_id,
-                "name": video_name,
-                "fps": fps,
-                "width": width,
-                "height": height
-            }
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        gts = list(pool.map(parse_gt_file, txt_file_paths, chunksize=8))
 
+    # IDs are assigned after the merge in sorted video order, so the output
+    # does not depend on directory listing or worker scheduling order.
+    train_videos, test_videos = [], []
+    image_id = 0
+    annotation_id = 0
+    for video_id, (video_name, gt) in enumerate(zip(video_names, gts), start=1):
+        frame_ids = gt['frame_ids']
+        # a new image starts wherever the frame id changes, as gt.txt is grouped by frame
+        new_image = np.ones(len(frame_ids), dtype=bool)
+        new_image[1:] = frame_ids[1:] != frame_ids[:-1]
+        annotation_image_ids = image_id + np.cumsum(new_image)
+        num_images = int(new_image.sum())
+
+        video = {
+            'name': video_name,
+            'video_id': video_id,
+            'info': {"id": video_id, "name": video_name, "fps": fps, "width": width, "height": height},
+            'gt': gt,
+            'image_ids': list(range(image_id + 1, image_id + num_images + 1)),
+            'image_frame_ids': frame_ids[new_image].tolist(),
+            'annotation_ids': range(annotation_id + 1, annotation_id + len(frame_ids) + 1),
+            'annotation_image_ids': annotation_image_ids.tolist(),
+        }
+        image_id += num_images
+        annotation_id += len(frame_ids)
+
+        if test_names is not None:
+            is_test_set = video_name in test_names
+        else:
             is_test_set = video_name.endswith('4') and split_data
-            if is_test_set:
-                test_dataset["videos"].append(video_info)
-            else:
-                train_dataset["videos"].append(video_info)
-
-            with open(txt_file_path, 'r') as f:
-                frame_id = -1
-                for line in f:
-                    fields = line.strip().split(',')
-                    frame_id_txt = int(fields[0])
-                    if frame_id_txt != frame_id:
-                        frame_id = frame_id_txt
-                        image_id += 1
-                        image_info = {
-                            "id": image_id,
-                            "video_id": video_id,
-                            "file_name": osp.join(video_name, 'img', f"{frame_id:06d}.jpg").replace("\\", "/"),
-                            "height": height,
-                            "width": width,
-                            "frame_id": frame_id - 1,
-                            "mot_frame_id": frame_id
-                        }
-
-                        if is_test_set:
-                            test_dataset["images"].append(image_info)
-                        else:
-                            train_dataset["images"].append(image_info)
-
-                    annotation_id += 1
-                    annotation_info = {
-                        "id": annotation_id,
-                        "image_id": image_id,
-                        "category_id": 1,
-                        "instance_id": int(fields[1]),
-                        "bbox": [float(x) for x in fields[2:6]],
-                        "area": float(fields[4]) * float(fields[5]),
-                        "iscrowd": False,
-                        "visibility": 1.0,
-                        "mot_instance_id": int(fields[1]),
-                        "mot_conf": float(fields[6]),
-                        "mot_class_id": 1
-                    }
-
-                    if is_test_set:
-                        test_dataset["annotations"].append(annotation_info)
-                    else:
-                        train_dataset["annotations"].append(annotation_info)
-
-    train_dataset["num_instances"] = len(train_dataset["images"])
-    test_dataset["num_instances"] = len(test_dataset["images"])
-
-    with open('train_dataset.json', 'w') as train_file:
-        json.dump(train_dataset, train_file, indent=4)
-
-    with open('test_dataset.json', 'w') as test_file:
-        json.dump(test_dataset, test_file, indent=4)
+        (test_videos if is_test_set else train_videos).append(video)
+
+    os.makedirs(out_dir, exist_ok=True)
+    write_dataset(osp.join(out_dir, 'train_dataset.json'), category_info, train_videos, width, height)
+    write_dataset(osp.join(out_dir, 'test_dataset.json'), category_info, test_videos, width, height)
 
     print("Processing complete.")
 
 if __name__ == '__main__':
     args = parse_args()
-    generate_dataset_structure(args.base_path, args.fps, args.width, args.height, args.split_data)
+    generate_dataset_structure(args.base_path, args.fps, args.width, args.height, args.split_data,
+                               args.split_manifest, args.out_dir, args.workers)
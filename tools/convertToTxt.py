@@ -1,5 +1,13 @@
 import json
 import argparse
+import heapq
+import os
+import tempfile
+import numpy as np
+
+HEADER = "frame_index,target_id,bbox_left,bbox_top,bbox_width,bbox_height,score,object_category,time\n"
+ROW_FORMAT = '%d,%d,%.3f,%.3f,%.3f,%.3f,1,1,%.3f'
+WHITESPACE = ' \t\r\n'
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Convert JSON annotation data to TXT format.")
@@ -7,56 +15,121 @@ def parse_args():
     parser.add_argument('--output-file', required=True, help="Path to the output TXT file.")
     parser.add_argument('--image-width', type=int, required=True, help="Width of the images.")
     parser.add_argument('--image-height', type=int, required=True, help="Height of the images.")
+    parser.add_argument('--run-rows', type=int, default=1000000, help="Number of rows sorted in memory before spilling a sorted run to disk.")
     return parser.parse_args()
 
-def round_floats(data):
-    if isinstance(data, dict):
-        for key, value in data.items():
-            data[key] = round_floats(value)
-    elif isinstance(data, list):
-        for i in range(len(data)):
-            data[i] = round_floats(data[i])
-    elif isinstance(data, float):
-        data = round(data, 3)
-    return data
-
-def json_to_txt(json_file, output_file, image_width, image_height):
-    with open(json_file, 'r') as file:
-        try:
-            data = json.load(file)
-            data = round_floats(data)
-        except json.JSONDecodeError as e:
-            print("JSONDecodeError:", e)
+def iter_json_array(f, chunk_size=1 << 20):
+    # Yields the elements of a top-level JSON array one at a time, so only the
+    # element being decoded (one Label Studio task) has to fit in memory.
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        # grow the read size with the pending data so large tasks decode in linear time
+        chunk = f.read(max(chunk_size, len(buffer) - pos))
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(WHITESPACE)
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise json.JSONDecodeError("Expecting '['", buffer, pos)
+    pos += 1
+    while True:
+        skip(WHITESPACE + ',')
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("Expecting ']'", buffer, pos)
+        if buffer[pos] == ']':
             return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        pos = end
+        yield item
 
-        frame_data = []
+def task_columns(task, image_width, image_height, first_target_id):
+    # Every annotation result of a task is one target; its keyframes become rows.
+    sequences = [result['value']['sequence'] for annotation in task['annotations'] for result in annotation['result']]
+    num_rows = sum(len(sequence) for sequence in sequences)
+    frame_index = np.empty(num_rows, dtype=np.int64)
+    target_id = np.empty(num_rows, dtype=np.int64)
+    values = np.empty((num_rows, 5), dtype=np.float64)
 
-        target_id_counter = 1
-        for item in data:
-            for annotation in item['annotations']:
-                for result in annotation['result']:
-                    sequence = result['value']['sequence']
-                    for data_point in sequence:
-                        frame_index = data_point.get('frame', '')
-                        bbox_left = data_point.get('x', '') / 100 * image_width
-                        bbox_top = data_point.get('y', '') / 100 * image_height
-                        bbox_width = data_point.get('width', '') / 100 * image_width
-                        bbox_height = data_point.get('height', '') / 100 * image_height
-                        score = 1
-                        object_category = 1
-                        time = round(data_point.get('time', ''), 3)
-                        target_id = target_id_counter
-
-                        frame_data.append((frame_index, target_id, bbox_left, bbox_top, bbox_width, bbox_height, score, object_category, time))
-                    target_id_counter += 1
-
-        frame_data.sort(key=lambda x: x[0])
+    row = 0
+    for offset, sequence in enumerate(sequences):
+        target_id[row:row + len(sequence)] = first_target_id + offset
+        for data_point in sequence:
+            frame_index[row] = data_point['frame']
+            values[row] = (data_point['x'], data_point['y'], data_point['width'], data_point['height'], data_point['time'])
+            row += 1
+
+    # Label Studio stores percentages; values are rounded to 3 decimals first.
+    values = np.round(values, 3)
+    scale = np.array([image_width, image_height, image_width, image_height])
+    values[:, :4] = values[:, :4] / 100 * scale
+    return frame_index, target_id, values, len(sequences)
 
+def write_run(run_dir, columns):
+    frame_index = np.concatenate([c[0] for c in columns])
+    target_id = np.concatenate([c[1] for c in columns])
+    values = np.concatenate([c[2] for c in columns])
+    order = np.argsort(frame_index, kind='stable')
+    path = os.path.join(run_dir, f'run_{len(os.listdir(run_dir)):06d}.txt')
+    rows = np.column_stack([frame_index[order], target_id[order], values[order]])
+    np.savetxt(path, rows, fmt=ROW_FORMAT)
+    return path
+
+def merge_runs(run_paths, output_file):
+    # Runs are sorted by frame; heapq.merge keeps equal frames in run order, so
+    # the output matches one stable sort over all rows.
+    files = [open(path, 'r') for path in run_paths]
+    try:
         with open(output_file, 'w') as f:
-            f.write("frame_index,target_id,bbox_left,bbox_top,bbox_width,bbox_height,score,object_category,time\n")
-            for frame in frame_data:
-                f.write(f"{frame[0]},{frame[1]},{frame[2]:.3f},{frame[3]:.3f},{frame[4]:.3f},{frame[5]:.3f},{frame[6]},{frame[7]},{frame[8]:.3f}\n")
-        print('successfully created output.txt')
+            f.write(HEADER)
+            f.writelines(heapq.merge(*files, key=lambda line: int(line.split(',', 1)[0])))
+    finally:
+        for run_file in files:
+            run_file.close()
+
+def json_to_txt(json_file, output_file, image_width, image_height, run_rows=1000000):
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    with open(json_file, 'r') as file, tempfile.TemporaryDirectory(dir=output_dir) as run_dir:
+        run_paths = []
+        columns = []
+        num_rows = 0
+        target_id_counter = 1
+        try:
+            for item in iter_json_array(file):
+                frame_index, target_id, values, num_targets = task_columns(item, image_width, image_height, target_id_counter)
+                target_id_counter += num_targets
+                columns.append((frame_index, target_id, values))
+                num_rows += len(frame_index)
+                if num_rows >= run_rows:
+                    run_paths.append(write_run(run_dir, columns))
+                    columns, num_rows = [], 0
+        except json.JSONDecodeError as e:
+            print("JSONDecodeError:", e)
+            return
+        if columns:
+            run_paths.append(write_run(run_dir, columns))
+
+        merge_runs(run_paths, output_file)
+    print('successfully created output.txt')
 if __name__ == '__main__':
     args = parse_args()
-    json_to_txt(args.json_file, args.output_file, args.image_width, args.image_height)
+    json_to_txt(args.json_file, args.output_file, args.image_width, args.image_height, args.run_rows)
@@ -0,0 +1,182 @@
+import numpy as np
+
+# Rows of result['track_bboxes'][class] produced by mmtrack's outs2results.
+TRACK_ID, X1, Y1, X2, Y2, SCORE = range(6)
+
+DIRECTIONS = ('any', 'positive', 'negative')
+
+
+def track_array(result):
+    # Stack the per-class track arrays of one frame into a single (n, 6) array.
+    bboxes = [bboxes for bboxes in result['track_bboxes'] if len(bboxes)]
+    if not bboxes:
+        return np.zeros((0, 6), dtype=np.float32)
+    return np.concatenate(bboxes, axis=0)
+
+
+def box_centers(tracks):
+    return np.stack([(tracks[:, X1] + tracks[:, X2]) / 2, (tracks[:, Y1] + tracks[:, Y2]) / 2], axis=1)
+
+
+def _grow(array, size, fill):
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+# Membership over non-negative track ids backed by a dense boolean array;
+# mmtrack hands out track ids incrementally, so the array stays compact.
+class TrackIdSet:
+    def __init__(self, capacity=256):
+        self._seen = np.zeros(capacity, dtype=bool)
+        self.count = 0
+
+    def __contains__(self, track_id):
+        return 0 <= track_id < len(self._seen) and bool(self._seen[int(track_id)])
+
+    def __len__(self):
+        return self.count
+
+    def add(self, ids):
+        # Returns a mask of the ids that were not seen before (first occurrence only).
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size == 0:
+            return np.zeros(0, dtype=bool)
+        self._seen = _grow(self._seen, int(ids.max()) + 1, False)
+        new = ~self._seen[ids]
+        _, first = np.unique(ids, return_index=True)
+        first_mask = np.zeros(len(ids), dtype=bool)
+        first_mask[first] = True
+        new &= first_mask
+        self._seen[ids] = True
+        self.count += int(new.sum())
+        return new
+
+
+# A counting line from `start` to `end` in image coordinates. The positive side
+# is the one where cross(end - start, point - start) > 0, i.e. below a line drawn
+# left to right. With trigger='cross' a track counts when its box center moves
+# across the line in `direction`; with trigger='touch' it counts as soon as its
+# box overlaps the line, regardless of direction.
+class Line:
+    def __init__(self, start, end, direction='any', trigger='cross', name=None):
+        if direction not in DIRECTIONS:
+            raise ValueError(f'direction must be one of {DIRECTIONS}, got {direction!r}')
+        if trigger not in ('cross', 'touch'):
+            raise ValueError(f"trigger must be 'cross' or 'touch', got {trigger!r}")
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.direction = direction
+        self.trigger = trigger
+        self.name = name
+        self._vector = self.end - self.start
+        self._length_sq = float(self._vector @ self._vector) or 1.0
+
+    def side(self, points):
+        offset = points - self.start
+        return np.sign(self._vector[0] * offset[:, 1] - self._vector[1] * offset[:, 0]).astype(np.int8)
+
+    def projection(self, points):
+        return (points - self.start) @ self._vector / self._length_sq
+
+    def touches(self, tracks):
+        corners = np.stack([
+            tracks[:, [X1, Y1]], tracks[:, [X2, Y1]], tracks[:, [X1, Y2]], tracks[:, [X2, Y2]]], axis=1)
+        sides = self.side(corners.reshape(-1, 2)).reshape(-1, 4)
+        t = self.projection(corners.reshape(-1, 2)).reshape(-1, 4)
+        straddles = (sides.min(axis=1) <= 0) & (sides.max(axis=1) >= 0)
+        overlaps = (t.max(axis=1) >= 0) & (t.min(axis=1) <= 1)
+        return straddles & overlaps
+
+
+# A counting zone given as polygon vertices; a track counts the first time its
+# box center is inside the polygon.
+class Zone:
+    def __init__(self, polygon, name=None):
+        self.polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError('A zone needs at least three vertices.')
+        self.name = name
+
+    def contains(self, points):
+        x, y = points[:, 0:1], points[:, 1:2]
+        x1, y1 = self.polygon[:, 0], self.polygon[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        spans = (y1 > y) != (y2 > y)
+        dy = np.where(y2 == y1, 1.0, y2 - y1)
+        x_cross = (x2 - x1) * (y - y1) / dy + x1
+        return ((spans & (x < x_cross)).sum(axis=1) % 2) == 1
+
+
+# Counts unique track ids per line or zone. update() takes the whole (n, 6)
+# track array of a frame and returns the ids newly counted by each region.
+class CrossingCounter:
+    def __init__(self, regions):
+        self.regions = list(regions)
+        for i, region in enumerate(self.regions):
+            if region.name is None:
+                region.name = f'{type(region).__name__.lower()}{i}'
+        self._counted = [TrackIdSet() for _ in self.regions]
+        # last known side of each track for every line, 0 when unknown
+        self._last_side = [np.zeros(256, dtype=np.int8) for _ in self.regions]
+
+    @property
+    def counts(self):
+        return {region.name: len(counted) for region, counted in zip(self.regions, self._counted)}
+
+    @property
+    def total(self):
+        return sum(len(counted) for counted in self._counted)
+
+    def update(self, tracks):
+        tracks = np.asarray(tracks)
+        ids = tracks[:, TRACK_ID].astype(np.int64) if len(tracks) else np.zeros(0, dtype=np.int64)
+        centers = box_centers(tracks) if len(tracks) else np.zeros((0, 2))
+        counted = {}
+        for k, region in enumerate(self.regions):
+            if isinstance(region, Zone):
+                hits = region.contains(centers)
+            elif region.trigger == 'touch':
+                hits = region.touches(tracks)
+            else:
+                hits = self._crossings(k, region, ids, centers)
+            new = self._counted[k].add(ids[hits])
+            counted[region.name] = ids[hits][new]
+        return counted
+
+    def _crossings(self, k, line, ids, centers):
+        if len(ids) == 0:
+            return np.zeros(0, dtype=bool)
+        self._last_side[k] = _grow(self._last_side[k], int(ids.max()) + 1, 0)
+        last_side = self._last_side[k]
+        side = line.side(centers)
+        previous = last_side[ids]
+        t = line.projection(centers)
+        hits = (previous != 0) & (side != 0) & (side != previous) & (t >= 0) & (t <= 1)
+        if line.direction == 'positive':
+            hits &= side > 0
+        elif line.direction == 'negative':
+            hits &= side < 0
+        known = side != 0
+        last_side[ids[known]] = side[known]
+        return hits
+
+
+def parse_line(spec, **kwargs):
+    # "x1,y1,x2,y2[,direction]"
+    parts = spec.split(',')
+    if len(parts) not in (4, 5):
+        raise ValueError(f'Invalid line {spec!r}, expected x1,y1,x2,y2[,direction].')
+    direction = parts[4] if len(parts) == 5 else 'any'
+    coords = [float(p) for p in parts[:4]]
+    return Line(coords[:2], coords[2:], direction=direction, **kwargs)
+
+
+def parse_zone(spec, **kwargs):
+    # "x1,y1,x2,y2,x3,y3,..."
+    coords = [float(p) for p in spec.split(',')]
+    if len(coords) % 2:
+        raise ValueError(f'Invalid zone {spec!r}, expected pairs of x,y coordinates.')
+    return Zone(coords, **kwargs)
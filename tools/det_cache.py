@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import os.path as osp
+from collections import defaultdict
+import mmcv
+import numpy as np
+import torch
+from mmtrack.core import imrenormalize, outs2results
+from mmtrack.models import build_motion, build_tracker
+from model_loader import strip_init_cfg
+from mot_inference import detect_batch
+
+# On-disk cache of what the networks produce for each test frame: the
+# detector's boxes (rescaled to the original image) and labels, and a ReID
+# embedding for every box. Tracker settings do not affect it, so the tracker
+# can be replayed from the cache without running the detector or the ReID.
+#
+# <root>/<key>/ holds bboxes.npy (n, 5), labels.npy (n, ), embeds.npy (n, d),
+# offsets.npy (frames + 1) and frames.json (file name per frame). The key is
+# a hash of both checkpoints and of the config parts that change the outputs.
+
+CACHE_VERSION = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def config_hash(cfg):
+    tracker_reid = cfg.model.tracker.get('reid') or {}
+    parts = dict(
+        detector=strip_init_cfg(cfg.model.detector),
+        reid=strip_init_cfg(cfg.model.reid),
+        crops=dict(img_scale=tracker_reid.get('img_scale'), img_norm_cfg=tracker_reid.get('img_norm_cfg')),
+        img_prefix=cfg.data.test.get('img_prefix'),
+        pipeline=cfg.data.test.pipeline)
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_path(root, cfg, detector_checkpoint, reid_checkpoint):
+    key = hashlib.sha1(' '.join([
+        str(CACHE_VERSION), file_hash(detector_checkpoint), file_hash(reid_checkpoint), config_hash(cfg)]).encode())
+    return osp.join(root, key.hexdigest()[:16])
+
+
+# Read side of one cache directory; frames are looked up by file name.
+class DetectionCache:
+    FILES = ('bboxes.npy', 'labels.npy', 'embeds.npy', 'offsets.npy', 'frames.json')
+
+    def __init__(self, cache_dir):
+        self.bboxes = np.load(osp.join(cache_dir, 'bboxes.npy'), mmap_mode='r')
+        self.labels = np.load(osp.join(cache_dir, 'labels.npy'), mmap_mode='r')
+        self.embeds = np.load(osp.join(cache_dir, 'embeds.npy'), mmap_mode='r')
+        self.offsets = np.load(osp.join(cache_dir, 'offsets.npy'))
+        with open(osp.join(cache_dir, 'frames.json'), 'r') as f:
+            self.rows = {filename: i for i, filename in enumerate(json.load(f))}
+
+    @classmethod
+    def exists(cls, cache_dir):
+        return all(osp.exists(osp.join(cache_dir, name)) for name in cls.FILES)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def frame(self, filename):
+        row = self.rows.get(filename)
+        if row is None:
+            raise KeyError(f'{filename} is not in the detection cache')
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return np.array(self.bboxes[start:end]), np.array(self.labels[start:end]), np.array(self.embeds[start:end])
+
+    @staticmethod
+    def write(cache_dir, frames, records):
+        # records: (bboxes, labels, embeds) numpy arrays per frame
+        os.makedirs(cache_dir, exist_ok=True)
+        embed_dim = next((embeds.shape[1] for _, _, embeds in records if embeds.ndim == 2), 0)
+        np.save(osp.join(cache_dir, 'bboxes.npy'),
+                np.concatenate([bboxes.reshape(-1, 5) for bboxes, _, _ in records]).astype(np.float32))
+        np.save(osp.join(cache_dir, 'labels.npy'), np.concatenate([labels for _, labels, _ in records]).astype(np.int64))
+        np.save(osp.join(cache_dir, 'embeds.npy'),
+                np.concatenate([embeds.reshape(-1, embed_dim) for _, _, embeds in records]).astype(np.float32))
+        np.save(osp.join(cache_dir, 'offsets.npy'), np.cumsum([0] + [len(labels) for _, labels, _ in records]).astype(np.int64))
+        # frames.json last: its presence marks a complete cache
+        with open(osp.join(cache_dir, 'frames.json'), 'w') as f:
+            json.dump(frames, f)
+
+
+def compute_frame(module, img, img_metas):
+    # Detections of one frame and the ReID embedding of each of them, with the
+    # crops the tracker would take.
+    _, det_bboxes, det_labels = detect_batch(module, img, img_metas)
+    bboxes, labels = det_bboxes[0], det_labels[0]
+    tracker = module.tracker
+    if tracker.reid.get('img_norm_cfg', False):
+        reid_img = imrenormalize(img, img_metas[0]['img_norm_cfg'], tracker.reid['img_norm_cfg'])
+    else:
+        reid_img = img
+    with torch.no_grad():
+        embeds = module.reid.simple_test(tracker.crop_imgs(reid_img, img_metas, bboxes[:, :4].clone(), rescale=True))
+    return bboxes, labels, embeds
+
+
+def build_det_cache(model, data_loader, cache_dir):
+    # model: the MMDataParallel-wrapped DeepSORT of tools/test.py
+    module = model.module
+    module.eval()
+    frames, records = [], []
+    prog_bar = mmcv.ProgressBar(len(data_loader.dataset))
+    for data in data_loader:
+        _, kwargs = model.scatter((), data, model.device_ids or [-1])
+        img, img_metas = kwargs[0]['img'][0], kwargs[0]['img_metas'][0]
+        bboxes, labels, embeds = compute_frame(module, img, img_metas)
+        frames.append(img_metas[0]['ori_filename'])
+        records.append(tuple(tensor.cpu().numpy() for tensor in (bboxes, labels, embeds)))
+        prog_bar.update()
+    DetectionCache.write(cache_dir, frames, records)
+    return cache_dir
+
+
+# Stands in for model.reid during a replay: the tracker's crops are the boxes
+# themselves (see replay_tracking) and their embeddings come from the cache.
+class ReplayReID:
+    def __init__(self):
+        self.bboxes = None
+        self.embeds = None
+
+    def set_frame(self, bboxes, embeds):
+        self.bboxes = bboxes
+        self.embeds = embeds
+
+    def simple_test(self, bboxes, **kwargs):
+        if bboxes.size(0) == 0:
+            return self.embeds.new_zeros((0, self.embeds.size(1)))
+        match = (bboxes[:, None, :4] == self.bboxes[None, :, :4]).all(dim=2)
+        return self.embeds[match.float().argmax(dim=1)]
+
+
+# The parts of DeepSORT the tracker uses: motion and reid.
+class ReplayModel:
+    with_motion = True
+
+    def __init__(self, motion):
+        self.motion = motion
+        self.reid = ReplayReID()
+
+
+def _boxes_as_crops(img, img_metas, bboxes, rescale=False):
+    return bboxes
+
+
+def build_replay_tracker(tracker_cfg):
+    tracker = build_tracker(tracker_cfg)
+    tracker.crop_imgs = _boxes_as_crops
+    return tracker
+
+
+def replay_tracking(cfg, cache, data_infos, tracker=None):
+    # Runs the tracker of cfg (or `tracker`) over the frames of data_infos in
+    # order and returns the same outputs as single_gpu_test.
+    tracker = build_replay_tracker(cfg.model.tracker) if tracker is None else tracker
+    model = ReplayModel(build_motion(cfg.model.motion))
+    num_classes = cfg.model.detector.roi_head.bbox_head.num_classes
+    # the tracker only clones or renormalizes the image for its crops
+    img = torch.zeros(1, 3, 1, 1)
+    img_metas = [dict(img_norm_cfg=cfg.get('img_norm_cfg'))]
+    outputs = defaultdict(list)
+    with torch.no_grad():
+        for info in data_infos:
+            frame_id = info['frame_id']
+            if frame_id == 0:
+                tracker.reset()
+            bboxes, labels, embeds = (torch.from_numpy(array) for array in cache.frame(info['filename']))
+            model.reid.set_frame(bboxes, embeds)
+            track_bboxes, track_labels, track_ids = tracker.track(
+                img=img, img_metas=img_metas, model=model, feats=None, bboxes=bboxes, labels=labels,
+                frame_id=frame_id, rescale=True)
+            track_results = outs2results(bboxes=track_bboxes, labels=track_labels, ids=track_ids, num_classes=num_classes)
+            det_results = outs2results(bboxes=bboxes, labels=labels, num_classes=num_classes)
+            outputs['det_bboxes'].append(det_results['bbox_results'])
+            outputs['track_bboxes'].append(track_results['bbox_results'])
+    return dict(outputs)
@@ -1,22 +1,36 @@
 import cv2
-import mmcv
-import os
-import numpy as np
 import json
-from mmtrack.apis import inference_mot, init_model
 import argparse
 import time
+from contextlib import nullcontext
+from async_output import LOG_FORMATS, AsyncDisplay, RecordLogger
+from counting import track_array
+from metrics_server import PipelineMetrics
+from model_loader import add_model_args, load_mot_model, model_source
+from mot_inference import MOTRunner
+from roi import add_roi_args, parse_roi
+from size_classifier import DIAGONAL_MODES, SizeClassifier
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Real-time object tracking and labeling from video or webcam.')
-    parser.add_argument('--input', help='Input video file path or webcam ID (integer).', default=0)
-    parser.add_argument('--config', required=True, help='Path to the MOT model configuration file.')
-    parser.add_argument('--detector-checkpoint', required=True, help='Path to the detector model checkpoint.')
-    parser.add_argument('--reid-checkpoint', required=True, help='Path to the re-identification model checkpoint.')
+    parser.add_argument('--input', help='Input video file path or webcam ID (integer).', default='0')
+    add_model_args(parser, '--config')
     parser.add_argument('--json-path', required=True, help='Path to the JSON file containing size ranges.')
     parser.add_argument('--device', default='cuda:0', help='Device to use for computation.')
     parser.add_argument('--log-file', default='process_log.txt', help='File to save processing logs.')
+    parser.add_argument('--log-format', choices=LOG_FORMATS, help='Log record format (default: text, or jsonl when headless).')
+    parser.add_argument('--log-every', type=int, help='Write a record at least every N frames even if the counts did not change (default: 1, or 30 when headless).')
+    parser.add_argument('--headless', action='store_true', help='Do not open a display window or print per-frame lines.')
     parser.add_argument('--fps', type=int, default=30, help='Frames per second for processing.')
+    parser.add_argument('--vote-frames', type=int, default=10, help='Number of observations voted on before a track\'s size label is fixed.')
+    parser.add_argument('--vote-max-age', type=int, default=30, help='Frames after which an unseen track\'s size label is fixed from the votes so far.')
+    parser.add_argument('--diagonal', choices=DIAGONAL_MODES, default='corner', help='How box diagonals are measured: corner (legacy, the '
+                        'x2/y2 corner\'s distance from the origin, which size.json is calibrated on) or box (true box diagonal; needs recalibrated ranges).')
+    parser.add_argument('--det-interval', type=int, default=1, help='Run the detector and ReID every K frames and use Kalman-predicted tracks in between.')
+    parser.add_argument('--batch-size', type=int, default=1, help='Number of frames the detector processes in one batch (offline video only).')
+    add_roi_args(parser)
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port.')
+    parser.add_argument('--metrics-host', default='127.0.0.1', help='Address the metrics endpoint binds to.')
     return parser.parse_args()
 
 
@@ -27,16 +41,14 @@ def draw_label_on_image(image, bbox, label):
     return image
 def main():
     args = parse_args()
-    cfg = mmcv.Config.fromfile(args.config)
-    cfg.model.detector.init_cfg.checkpoint = args.detector_checkpoint
-    cfg.model.reid.init_cfg.checkpoint = args.reid_checkpoint
+    mot_config = model_source(args.artifact, args.config, args.detector_checkpoint, args.reid_checkpoint)
 
     # Load size ranges from JSON
     with open(args.json_path, 'r') as f:
         size_ranges = json.load(f)
 
     # Initialize model
-    mot_model = init_model(cfg, device=args.device)
+    mot_model = load_mot_model(mot_config, args.device, backend=args.backend, backend_dir=args.backend_dir)
 
     # Set up video capture
     if args.input.isdigit():
@@ -44,50 +56,87 @@ def main():
     else:
         cap = cv2.VideoCapture(args.input)  # Video file
 
-    label_counts = {label: 0 for label in size_ranges}
-    tracked_ids = {}
+    classifier = SizeClassifier(size_ranges, vote_frames=args.vote_frames, max_age=args.vote_max_age, diagonal=args.diagonal)
+    label_counts = classifier.counts
     frame_counter = 0
     start_time = time.time()
 
-    # Open log file
-    log_file = open(args.log_file, 'w')
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        result = inference_mot(mot_model, frame, frame_id=frame_counter)
-        for bbox in result['track_bboxes'][0]:
-            if isinstance(bbox, np.ndarray) and bbox.ndim == 1 and len(bbox) >= 5:
-                track_id, xmin, ymin, bbox_width, bbox_height = bbox[:5]
-                diagonal = np.sqrt(bbox_width**2 + bbox_height**2)
-                label = "Undefined"
-                for size_label, (min_diag, max_diag) in size_ranges.items():
-                    if min_diag <= diagonal <= max_diag:
-                        label = size_label
-                        break
-
-                if track_id not in tracked_ids.keys():
-                    tracked_ids[track_id] = label
-                    label_counts[label] += 1
-
-                frame = draw_label_on_image(frame, (xmin, ymin, bbox_width, bbox_height), label)
+    # Logging and display run on background threads
+    log_format = args.log_format or ('jsonl' if args.headless else 'text')
+    log_every = args.log_every or (30 if args.headless else 1)
+    logger = RecordLogger(args.log_file, fmt=log_format, every=log_every, echo=not args.headless)
+    display = None if args.headless else AsyncDisplay('Tracking')
+
+    runner = MOTRunner(mot_model, batch_size=args.batch_size, det_interval=args.det_interval,
+                       roi=parse_roi(args.roi, args.roi_polygon))
+
+    # Optional Prometheus endpoint; gauges backed by functions cost nothing per frame
+    metrics = PipelineMetrics(args.metrics_port, args.metrics_host) if args.metrics_port else None
+    if metrics is not None:
+        metrics.watch_counts(label_counts, classifier.labels)
+        metrics.watch_queue('log', logger.queue)
+        if display is not None:
+            metrics.watch_queue('display', display.queue)
+            metrics.watch_dropped('display', display)
+    timed = metrics.stage if metrics is not None else (lambda name: nullcontext())
+
+    def handle(frame, result):
+        nonlocal frame_counter
+        tracks = track_array(result)
+        with timed('classify'):
+            label_ids = classifier.update(frame_counter, tracks)
+        if metrics is not None:
+            metrics.set_tracks(len(tracks))
+            metrics.frame_done()
 
         frame_counter += 1
         elapsed_time = time.time() - start_time
-        real_time = time.strftime("%H:%M:%S", time.gmtime(elapsed_time))
-
-        log_file.write(f'Frame: {frame_counter}, Time: {real_time}, Labels: {label_counts}\n')
-        print(f'Frame: {frame_counter}, Time: {real_time}, Labels: {label_counts}')
-
-        cv2.imshow('Tracking', frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    log_file.close()
+        logger.update(dict(frame=frame_counter, time=round(elapsed_time, 3), **label_counts))
+
+        if display is None:
+            return False
+        with timed('render'):
+            for bbox, label_id in zip(tracks, label_ids):
+                track_id, xmin, ymin, xmax, ymax = bbox[:5]
+                frame = draw_label_on_image(frame, (xmin, ymin, xmax - xmin, ymax - ymin), classifier.labels[label_id])
+        display.show(frame)
+        return display.quit_requested.is_set()
+
+    try:
+        frame_id = 0
+        stopped = False
+        while not stopped:
+            with timed('decode'):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            with timed('inference'):
+                outputs = runner.push(frame_id, frame)
+            for _, tracked_frame, result in outputs:
+                stopped = stopped or handle(tracked_frame, result)
+            frame_id += 1
+        if not stopped:
+            with timed('inference'):
+                outputs = runner.flush()
+            for _, tracked_frame, result in outputs:
+                if handle(tracked_frame, result):
+                    break
+
+        classifier.flush()
+        elapsed_time = time.time() - start_time
+        logger.log(dict(frame=frame_counter, time=round(elapsed_time, 3), **label_counts))
+        print(f'Final labels: {label_counts}')
+        if hasattr(mot_model.tracker, 'reid_summary'):
+            print(mot_model.tracker.reid_summary())
+        print(f'Processed {frame_counter} frames at {frame_counter / max(elapsed_time, 1e-6):.2f} FPS (batch size {args.batch_size})')
+    finally:
+        # flushes the records still queued and stops the threads, also on errors and Ctrl-C
+        cap.release()
+        if display is not None:
+            display.close()
+        logger.close()
+        if metrics is not None:
+            metrics.close()
 
 if __name__ == '__main__':
     main()
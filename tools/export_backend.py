@@ -0,0 +1,97 @@
+import argparse
+import itertools
+import json
+import sys
+import numpy as np
+import torch
+from mmtrack.apis import inference_mot
+from counting import track_array
+from inference_backend import EXTENSIONS, apply_backend, export_backend, reid_input_size
+from model_loader import add_model_args, load_mot_model, model_source
+from mot_inference import build_test_pipeline, prepare_batch
+from video_stream import FrameReader
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export the detector backbone/FPN and the ReID network to TorchScript or ONNX and check them against PyTorch.')
+    add_model_args(parser)
+    parser.add_argument('--det-input-size', type=int, nargs=2, default=(480, 800), metavar=('HEIGHT', 'WIDTH'), help='Padded detector input size used for tracing.')
+    parser.add_argument('--skip-export', action='store_true', help='Only run the parity check on an existing export.')
+    parser.add_argument('--parity-input', help='Video file or image directory for the parity check. Random frames are used when omitted.')
+    parser.add_argument('--parity-frames', type=int, default=30, help='Number of frames tracked with both backends.')
+    parser.add_argument('--feature-atol', type=float, default=1e-2, help='Allowed absolute difference of FPN features and ReID embeddings.')
+    parser.add_argument('--box-atol', type=float, default=0.5, help='Allowed difference of track box coordinates in pixels.')
+    return parser.parse_args()
+
+def load_frames(source, num_frames, shape=(720, 1280)):
+    if source is None:
+        rng = np.random.RandomState(0)
+        return [rng.randint(0, 256, size=(*shape, 3), dtype=np.uint8) for _ in range(num_frames)]
+    reader = FrameReader(source, max_queue=num_frames)
+    try:
+        return [frame for _, frame in itertools.islice(reader, num_frames)]
+    finally:
+        reader.stop()
+
+def run_model(model, frames, crops):
+    pipeline = build_test_pipeline(model.cfg)
+    img, _ = prepare_batch(model, pipeline, frames[:1], [0])
+    with torch.no_grad():
+        feats = model.detector.extract_feat(img)
+        embeds = model.reid.simple_test(crops)
+    tracks = []
+    for frame_id, frame in enumerate(frames):
+        frame_tracks = track_array(inference_mot(model, frame, frame_id=frame_id))
+        tracks.append(frame_tracks[np.argsort(frame_tracks[:, 0], kind='stable')])
+    return feats, embeds, tracks
+
+def check_parity(model, backend, backend_dir, frames, feature_atol=1e-2, box_atol=0.5):
+    # Runs the same frames through eager PyTorch and through the exported
+    # networks: raw FPN features and ReID embeddings, then full tracking.
+    device = next(model.parameters()).device
+    crops = torch.rand(4, 3, *reid_input_size(model), generator=torch.Generator().manual_seed(0)).to(device)
+    eager_feats, eager_embeds, eager_tracks = run_model(model, frames, crops)
+    restore = apply_backend(model, backend, backend_dir)
+    try:
+        feats, embeds, tracks = run_model(model, frames, crops)
+    finally:
+        restore()
+
+    id_mismatches = 0
+    box_diff = 0.0
+    for eager, exported in zip(eager_tracks, tracks):
+        if eager.shape != exported.shape or not np.array_equal(eager[:, 0], exported[:, 0]):
+            id_mismatches += 1
+        elif len(eager):
+            box_diff = max(box_diff, float(np.abs(eager[:, 1:5] - exported[:, 1:5]).max()))
+    report = dict(
+        backend=backend,
+        frames=len(frames),
+        feature_max_abs_diff=max(float((a - b).abs().max()) for a, b in zip(eager_feats, feats)),
+        embedding_max_abs_diff=float((eager_embeds - embeds).abs().max()),
+        track_frames_with_id_mismatch=id_mismatches,
+        track_box_max_abs_diff=box_diff,
+        eager_tracks=int(sum(len(t) for t in eager_tracks)),
+        backend_tracks=int(sum(len(t) for t in tracks)))
+    report['passed'] = (report['feature_max_abs_diff'] <= feature_atol and report['embedding_max_abs_diff'] <= feature_atol
+                        and id_mismatches == 0 and box_diff <= box_atol)
+    return report
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.backend not in EXTENSIONS:
+        raise ValueError(f'--backend must be one of {tuple(EXTENSIONS)}')
+    if args.backend_dir is None:
+        raise ValueError('--backend-dir is required')
+    mot_config = model_source(args.artifact, args.config, args.detector_checkpoint, args.reid_checkpoint)
+    # the model itself stays on eager PyTorch; the backend is applied per check
+    model = load_mot_model(mot_config, 'cpu', warmup=False)
+
+    if not args.skip_export:
+        for path in export_backend(model, args.backend, args.backend_dir, tuple(args.det_input_size)):
+            print(f'Exported {path}')
+
+    frames = load_frames(args.parity_input, args.parity_frames)
+    report = check_parity(model, args.backend, args.backend_dir, frames, args.feature_atol, args.box_atol)
+    print(json.dumps(report, indent=2))
+    if not report['passed']:
+        sys.exit(1)
@@ -0,0 +1,25 @@
+import argparse
+import time
+from model_loader import export_artifact, load_artifact, model_source
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export a MOT config and its trained weights into a single self-contained artifact.')
+    parser.add_argument('--config', required=True, help='Path to the MOT model configuration file.')
+    parser.add_argument('--detector-checkpoint', required=True, help='Path to the detector model checkpoint.')
+    parser.add_argument('--reid-checkpoint', required=True, help='Path to the re-identification model checkpoint.')
+    parser.add_argument('--out', required=True, help='Path of the artifact to write (.pth).')
+    parser.add_argument('--warmup-size', type=int, nargs=2, default=(1280, 720), metavar=('WIDTH', 'HEIGHT'), help='Frame size used for the warm-up inference after loading.')
+    parser.add_argument('--verify', action='store_true', help='Load the written artifact once and report the load time.')
+    parser.add_argument('--device', default='cpu', help='Device used by --verify.')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    mot_config = model_source(None, args.config, args.detector_checkpoint, args.reid_checkpoint)
+    width, height = args.warmup_size
+    print(f'Artifact written to {export_artifact(mot_config, args.out, (height, width))}')
+
+    if args.verify:
+        start_time = time.time()
+        load_artifact(args.out, device=args.device)
+        print(f'Loaded and warmed up in {time.time() - start_time:.2f}s on {args.device}')
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import os.path as osp
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from mmdet.datasets.builder import PIPELINES
+
+# A cache of training frames decoded once and resized to the working
+# resolution: all pixels in one flat uint8 memmap (pixels.npy), one
+# (offset, height, width) row per frame (index.npy), the frame file names
+# (files.json) and the COCO-video annotation file with boxes rescaled to the
+# cached frames (annotations.json). Point the dataset's ann_file at the
+# latter and replace the image loading transform with LoadImageFromCache /
+# LoadMultiImagesFromCache.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Decode and resize training frames once into a memory-mapped cache.')
+    parser.add_argument('--ann-file', required=True, help='COCO-video annotation file written by convertToCoco.py.')
+    parser.add_argument('--img-prefix', required=True, help='Directory the file names in the annotation file are relative to.')
+    parser.add_argument('--out', required=True, help='Cache directory.')
+    parser.add_argument('--scale', type=int, default=960, help='Long edge of the cached frames. The default is the largest SeqResize scale '
+                        '(800 x ratio 1.2), so augmentation never upsamples.')
+    parser.add_argument('--workers', type=int, default=8, help='Threads decoding frames.')
+    return parser.parse_args()
+
+def cached_size(width, height, scale):
+    # the (width, height) mmcv.imrescale gives for img_scale=(scale, scale)
+    factor = min(scale / max(width, height), scale / min(width, height))
+    return int(width * factor + 0.5), int(height * factor + 0.5)
+
+def build_cache(ann_file, img_prefix, out_dir, scale=960, workers=8):
+    with open(ann_file, 'r') as f:
+        ann = json.load(f)
+    os.makedirs(out_dir, exist_ok=True)
+    images = ann['images']
+    sizes = [cached_size(image['width'], image['height'], scale) for image in images]
+    lengths = np.array([width * height * 3 for width, height in sizes], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    index = np.column_stack([offsets, [h for _, h in sizes], [w for w, _ in sizes]]).astype(np.int64)
+    pixels = np.lib.format.open_memmap(osp.join(out_dir, 'pixels.npy'), mode='w+', dtype=np.uint8, shape=(int(lengths.sum()), ))
+
+    def store(i):
+        image = images[i]
+        img = cv2.imread(osp.join(img_prefix, image['file_name']), cv2.IMREAD_COLOR)
+        if img is None:
+            raise IOError(f"Could not read {image['file_name']}")
+        if img.shape[:2] != (image['height'], image['width']):
+            raise ValueError(f"{image['file_name']} is {img.shape[1]}x{img.shape[0]}, the annotation file says "
+                             f"{image['width']}x{image['height']}")
+        width, height = sizes[i]
+        pixels[offsets[i]:offsets[i] + lengths[i]] = cv2.resize(img, (width, height), interpolation=cv2.INTER_LINEAR).reshape(-1)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(store, range(len(images))):
+            pass
+    pixels.flush()
+    np.save(osp.join(out_dir, 'index.npy'), index)
+    with open(osp.join(out_dir, 'files.json'), 'w') as f:
+        json.dump([image['file_name'] for image in images], f)
+
+    # boxes are scaled per axis like mmdet's Resize does
+    factors = {image['id']: (w / image['width'], h / image['height']) for image, (w, h) in zip(images, sizes)}
+    for image, (width, height) in zip(images, sizes):
+        image['width'], image['height'] = width, height
+    for annotation in ann['annotations']:
+        fx, fy = factors[annotation['image_id']]
+        x, y, w, h = annotation['bbox']
+        annotation['bbox'] = [x * fx, y * fy, w * fx, h * fy]
+        annotation['area'] = annotation['bbox'][2] * annotation['bbox'][3]
+    with open(osp.join(out_dir, 'annotations.json'), 'w') as f:
+        json.dump(ann, f, separators=(',', ':'))
+    with open(osp.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(dict(ann_file=ann_file, img_prefix=img_prefix, scale=scale, frames=len(images)), f, indent=2)
+    return out_dir
+
+
+# Read side of the cache; frames are views into the memmap.
+class FrameCache:
+    def __init__(self, cache_dir):
+        self.pixels = np.load(osp.join(cache_dir, 'pixels.npy'), mmap_mode='r')
+        self.index = np.load(osp.join(cache_dir, 'index.npy'))
+        with open(osp.join(cache_dir, 'files.json'), 'r') as f:
+            self.rows = {file_name: i for i, file_name in enumerate(json.load(f))}
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, file_name):
+        row = self.rows.get(file_name)
+        if row is None:
+            raise KeyError(f'{file_name} is not in the frame cache')
+        offset, height, width = self.index[row]
+        return self.pixels[offset:offset + height * width * 3].reshape(height, width, 3)
+
+
+# Drop-in for LoadImageFromFile: slices the frame out of the cache instead of
+# decoding it. The cache is opened lazily in each dataloader worker.
+@PIPELINES.register_module()
+class LoadImageFromCache:
+    def __init__(self, cache_dir, to_float32=False):
+        self.cache_dir = cache_dir
+        self.to_float32 = to_float32
+        self._cache = None
+
+    def __call__(self, results):
+        if self._cache is None:
+            self._cache = FrameCache(self.cache_dir)
+        file_name = results['img_info']['filename']
+        img = self._cache.get(file_name)
+        img = img.astype(np.float32) if self.to_float32 else img.copy()
+        prefix = results.get('img_prefix')
+        results['filename'] = osp.join(prefix, file_name) if prefix is not None else file_name
+        results['ori_filename'] = file_name
+        results['img'] = img
+        results['img_shape'] = img.shape
+        results['ori_shape'] = img.shape
+        results['img_fields'] = ['img']
+        return results
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(cache_dir={self.cache_dir!r}, to_float32={self.to_float32})'
+
+
+# Drop-in for LoadMultiImagesFromFile (key and reference frames).
+@PIPELINES.register_module()
+class LoadMultiImagesFromCache(LoadImageFromCache):
+    def __call__(self, results):
+        return [super(LoadMultiImagesFromCache, self).__call__(_results) for _results in results]
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    out_dir = build_cache(args.ann_file, args.img_prefix, args.out, args.scale, args.workers)
+    print(f'Frame cache written to {out_dir}')
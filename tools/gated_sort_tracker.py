@@ -0,0 +1,169 @@
+import numpy as np
+import torch
+from mmcv.runner import force_fp32
+from mmdet.core import bbox_overlaps
+from motmetrics.lap import linear_sum_assignment
+from mmtrack.core import imrenormalize
+from mmtrack.core.bbox import bbox_xyxy_to_cxcyah
+from mmtrack.models import TRACKERS
+from mmtrack.models.trackers import SortTracker
+
+
+# SortTracker that only runs the ReID network on detections whose association
+# is ambiguous. A detection is matched without appearance features when exactly
+# one confirmed track from the previous frame overlaps it with IoU above
+# `gate_iou_thr` (inside the Kalman gate) and that track overlaps no other
+# detection above the threshold. Everything else goes through the regular
+# ReID + IoU association of SortTracker.
+@TRACKERS.register_module()
+class GatedSortTracker(SortTracker):
+    def __init__(self, gate_iou_thr=None, **kwargs):
+        super().__init__(**kwargs)
+        self.gate_iou_thr = self.match_iou_thr if gate_iou_thr is None else gate_iou_thr
+        self.num_reid_forwards = 0
+        self.num_reid_skipped = 0
+
+    def reid_summary(self):
+        total = self.num_reid_forwards + self.num_reid_skipped
+        skipped = 100.0 * self.num_reid_skipped / total if total else 0.0
+        return (f'ReID embeddings computed for {self.num_reid_forwards} of {total} detections '
+                f'({self.num_reid_skipped} skipped, {skipped:.1f}%)')
+
+    def _embed(self, model, reid_img, img_metas, bboxes, rescale):
+        self.num_reid_forwards += bboxes.size(0)
+        return model.reid.simple_test(self.crop_imgs(reid_img, img_metas, bboxes[:, :4].clone(), rescale))
+
+    def _last_embed(self, track_id):
+        embeds = self.tracks[track_id]['embeds']
+        return embeds[-1][0] if isinstance(embeds, list) else embeds[0]
+
+    def _confident_matches(self, bboxes, labels, frame_id, costs):
+        # Returns (det_inds, track_ids) of unambiguous one-to-one IoU matches.
+        candidate_ids = [
+            id for id in self.confirmed_ids if self.tracks[id].frame_ids[-1] == frame_id - 1]
+        if len(candidate_ids) == 0 or bboxes.size(0) == 0:
+            return [], []
+        track_bboxes = self.get('bboxes', candidate_ids)
+        ious = bbox_overlaps(track_bboxes, bboxes[:, :4]).cpu().numpy()
+        track_labels = np.array([int(self.tracks[id]['labels'][-1]) for id in candidate_ids])
+        mask = (ious >= self.gate_iou_thr) & (track_labels[:, None] == labels.cpu().numpy()[None, :])
+        if costs is not None:
+            rows = [self.ids.index(id) for id in candidate_ids]
+            mask &= np.isfinite(costs[rows, :])
+        unique = mask & (mask.sum(axis=1, keepdims=True) == 1) & (mask.sum(axis=0, keepdims=True) == 1)
+        rows, cols = np.nonzero(unique)
+        return cols.tolist(), [candidate_ids[r] for r in rows]
+
+    @force_fp32(apply_to=('img', 'bboxes'))
+    def track(self, img, img_metas, model, bboxes, labels, frame_id, rescale=False, **kwargs):
+        # Follows SortTracker.track; the ReID forward is restricted to the
+        # detections left unmatched by the IoU gate.
+        if not hasattr(self, 'kf'):
+            self.kf = model.motion
+
+        if self.with_reid:
+            if self.reid.get('img_norm_cfg', False):
+                reid_img = imrenormalize(img, img_metas[0]['img_norm_cfg'], self.reid['img_norm_cfg'])
+            else:
+                reid_img = img.clone()
+
+        valid_inds = bboxes[:, -1] > self.obj_score_thr
+        bboxes = bboxes[valid_inds]
+        labels = labels[valid_inds]
+
+        if self.empty or bboxes.size(0) == 0:
+            num_new_tracks = bboxes.size(0)
+            ids = torch.arange(self.num_tracks, self.num_tracks + num_new_tracks, dtype=torch.long)
+            self.num_tracks += num_new_tracks
+            if self.with_reid:
+                embeds = self._embed(model, reid_img, img_metas, bboxes, rescale)
+        else:
+            ids = torch.full((bboxes.size(0), ), -1, dtype=torch.long)
+
+            # motion
+            costs = None
+            if model.with_motion:
+                self.tracks, costs = model.motion.track(self.tracks, bbox_xyxy_to_cxcyah(bboxes))
+
+            if self.with_reid:
+                confident_dets, confident_ids = self._confident_matches(bboxes, labels, frame_id, costs)
+                for c, id in zip(confident_dets, confident_ids):
+                    ids[c] = id
+                self.num_reid_skipped += len(confident_dets)
+
+                ambiguous_dets = torch.nonzero(ids == -1).squeeze(1)
+                active_ids = [id for id in self.confirmed_ids if id not in confident_ids]
+                embeds = None
+                if ambiguous_dets.numel() > 0:
+                    ambiguous_embeds = self._embed(model, reid_img, img_metas, bboxes[ambiguous_dets], rescale)
+                    embeds = ambiguous_embeds.new_zeros((bboxes.size(0), ambiguous_embeds.size(1)))
+                    embeds[ambiguous_dets] = ambiguous_embeds
+
+                    # reid
+                    if len(active_ids) > 0:
+                        track_embeds = self.get(
+                            'embeds', active_ids, self.reid.get('num_samples', None), behavior='mean')
+                        reid_dists = torch.cdist(track_embeds, ambiguous_embeds)
+
+                        # support multi-class association
+                        track_labels = torch.tensor(
+                            [self.tracks[id]['labels'][-1] for id in active_ids]).to(bboxes.device)
+                        cate_match = labels[None, ambiguous_dets] == track_labels[:, None]
+                        cate_cost = (1 - cate_match.int()) * 1e6
+                        reid_dists = (reid_dists + cate_cost).cpu().numpy()
+
+                        if costs is not None:
+                            valid_inds = [self.ids.index(_) for _ in active_ids]
+                            reid_dists[~np.isfinite(costs[valid_inds][:, ambiguous_dets.cpu().numpy()])] = np.nan
+
+                        row, col = linear_sum_assignment(reid_dists)
+                        for r, c in zip(row, col):
+                            dist = reid_dists[r, c]
+                            if not np.isfinite(dist):
+                                continue
+                            if dist <= self.reid['match_score_thr']:
+                                ids[ambiguous_dets[c]] = active_ids[r]
+
+                # confidently matched detections keep their track's latest embedding
+                for c, id in zip(confident_dets, confident_ids):
+                    last_embed = self._last_embed(id)
+                    if embeds is None:
+                        embeds = last_embed.new_zeros((bboxes.size(0), last_embed.numel()))
+                    embeds[c] = last_embed
+
+            active_ids = [
+                id for id in self.ids if id not in ids
+                and self.tracks[id].frame_ids[-1] == frame_id - 1
+            ]
+            if len(active_ids) > 0:
+                active_dets = torch.nonzero(ids == -1).squeeze(1)
+                track_bboxes = self.get('bboxes', active_ids)
+                ious = bbox_overlaps(track_bboxes, bboxes[active_dets][:, :4])
+
+                # support multi-class association
+                track_labels = torch.tensor(
+                    [self.tracks[id]['labels'][-1] for id in active_ids]).to(bboxes.device)
+                cate_match = labels[None, active_dets] == track_labels[:, None]
+                cate_cost = (1 - cate_match.int()) * 1e6
+
+                dists = (1 - ious + cate_cost).cpu().numpy()
+
+                row, col = linear_sum_assignment(dists)
+                for r, c in zip(row, col):
+                    dist = dists[r, c]
+                    if dist < 1 - self.match_iou_thr:
+                        ids[active_dets[c]] = active_ids[r]
+
+            new_track_inds = ids == -1
+            ids[new_track_inds] = torch.arange(
+                self.num_tracks, self.num_tracks + new_track_inds.sum(), dtype=torch.long)
+            self.num_tracks += new_track_inds.sum()
+
+        self.update(
+            ids=ids,
+            bboxes=bboxes[:, :4],
+            scores=bboxes[:, -1],
+            labels=labels,
+            embeds=embeds if self.with_reid else None,
+            frame_ids=frame_id)
+        return bboxes, labels, ids
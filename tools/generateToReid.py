@@ -4,8 +4,10 @@ import os.path as osp
 import mmcv
 import numpy as np
 import random
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+import annotation_store
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Generate a ReID dataset for tracking')
@@ -15,8 +17,73 @@ def parse_args():
     parser.add_argument('--min-object', type=int, default=1, help='minimum number of objects per identity')
     parser.add_argument('--max-object', type=int, default=50, help='maximum number of objects per identity')
     parser.add_argument('--vis-threshold', type=float, default=0.0, help='visibility threshold for objects')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes cropping videos')
+    parser.add_argument('--write-workers', type=int, default=4, help='number of threads writing crops in each process')
+    parser.add_argument('--shards', type=int, default=0, help='write crops resized to --crop-size into this many memory-mapped shards instead of JPEG files')
+    parser.add_argument('--crop-size', type=int, nargs=2, default=(128, 256), metavar=('WIDTH', 'HEIGHT'), help='size of the crops stored in shards')
     return parser.parse_args()
 
+def load_video_rows(base_path, video_name, vis_threshold):
+    data_file_path = osp.join(base_path, video_name, 'gt/gt.txt')
+    if not osp.exists(data_file_path):
+        return None
+    rows = annotation_store.load(data_file_path).rows
+    return rows[rows['score'] >= vis_threshold]
+
+def iter_crops(base_path, video_name, rows):
+    # (instance id, crop) per annotation row; each frame is read once
+    img_folder = osp.join(base_path, video_name, 'img')
+    raw_img_names = sorted(os.listdir(img_folder))
+    last_frame_id = -1
+    columns = zip(*(rows[name].tolist() for name in ('frame', 'track_id', 'x', 'y', 'w', 'h')))
+    for frame_id, ins_id, x, y, w, h in columns:
+        if frame_id != last_frame_id:
+            raw_img_name = raw_img_names[frame_id - 1]
+            raw_img = mmcv.imread(f'{img_folder}/{raw_img_name}')
+            last_frame_id = frame_id
+        xyxy = np.asarray([x, y, x + w, y + h])
+        yield ins_id, mmcv.imcrop(raw_img, xyxy)
+
+def crop_video(base_path, video_name, reid_train_folder, vis_threshold, write_workers=4):
+    rows = load_video_rows(base_path, video_name, vis_threshold)
+    if rows is None:
+        return 0
+
+    # next crop index per identity; the output folders start out empty
+    crop_counts = {}
+    num_crops = 0
+    pending_writes = deque()
+    with ThreadPoolExecutor(max_workers=write_workers) as writers:
+        for ins_id, reid_img in iter_crops(base_path, video_name, rows):
+
+            reid_img_folder = osp.join(reid_train_folder, f'{video_name}_{ins_id:06d}')
+            if ins_id not in crop_counts:
+                os.makedirs(reid_img_folder, exist_ok=True)
+                crop_counts[ins_id] = 0
+            idx = crop_counts[ins_id]
+            crop_counts[ins_id] += 1
+            reid_img_name = f'{idx:06d}.jpg'
+            pending_writes.append(writers.submit(
+                mmcv.imwrite, reid_img, f'{reid_img_folder}/{reid_img_name}', auto_mkdir=False))
+            if len(pending_writes) > 8 * write_workers:
+                pending_writes.popleft().result()
+            num_crops += 1
+        for future in pending_writes:
+            future.result()
+    return num_crops
+
+def crop_video_to_shard(base_path, video_name, vis_threshold, shard_path, start, crop_size):
+    # Writes the resized crops of one video to rows start.. of a preallocated
+    # shard; videos write disjoint rows, so processes can share a shard.
+    rows = load_video_rows(base_path, video_name, vis_threshold)
+    shard = np.load(shard_path, mmap_mode='r+')
+    ins_ids = []
+    for i, (ins_id, reid_img) in enumerate(iter_crops(base_path, video_name, rows)):
+        shard[start + i] = mmcv.imresize(reid_img, crop_size)
+        ins_ids.append(ins_id)
+    shard.flush()
+    return ins_ids
+
 def generate_reid_dataset(args):
     base_path, output_path, val_split, min_object, max_object, vis_threshold = args.base_path, args.output_path, args.val_split, args.min_object, args.max_object, args.vis_threshold
     if not osp.isdir(output_path):
@@ -25,49 +92,75 @@ def generate_reid_dataset(args):
         raise OSError(f'Directory must be empty: \'{output_path}\'')
 
     video_names = os.listdir(base_path)
+    if args.shards:
+        identities = write_reid_shards(base_path, video_names, osp.join(output_path, 'shards'), vis_threshold, args.shards,
+                                       tuple(args.crop_size), args.workers)
+        split_data_into_train_val(output_path, identities, val_split, min_object, max_object)
+        return
+
     reid_train_folder = osp.join(output_path, 'imgs')
     os.makedirs(reid_train_folder, exist_ok=True)
 
-    for video_name in tqdm(video_names):
-        video_folder = osp.join(base_path, video_name)
-        img_folder = osp.join(video_folder, 'img')
-        data_file_path = osp.join(video_folder, 'gt/gt.txt')
-        if not osp.exists(data_file_path):
-            continue
-
-        raw_img_names = sorted(os.listdir(img_folder))
-        data_lines = mmcv.list_from_file(data_file_path)
-
-        last_frame_id = -1
-        for line in data_lines:
-            line = line.strip().split(',')
-            frame_id, ins_id = map(int, line[:2])
-            x, y, w, h = map(float, line[2:6])
-            confidence = float(line[6])
+    # identities are per video, so videos can be cropped independently
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(crop_video, base_path, video_name, reid_train_folder, vis_threshold, args.write_workers)
+            for video_name in video_names]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            future.result()
 
-            if confidence < vis_threshold:
-                continue
+    # Create training and validation lists
+    identities = {name: [f'{name}/{img_name}' for img_name in os.listdir(osp.join(reid_train_folder, name))]
+                  for name in os.listdir(reid_train_folder)}
+    split_data_into_train_val(output_path, identities, val_split, min_object, max_object)
 
-            reid_img_folder = osp.join(reid_train_folder, f'{video_name}_{ins_id:06d}')
-            os.makedirs(reid_img_folder, exist_ok=True)
-            idx = len(os.listdir(reid_img_folder))
-            reid_img_name = f'{idx:06d}.jpg'
-            if frame_id != last_frame_id:
-                raw_img_name = raw_img_names[frame_id - 1]
-                raw_img = mmcv.imread(f'{img_folder}/{raw_img_name}')
-                last_frame_id = frame_id
-            xyxy = np.asarray([x, y, x + w, y + h])
-            reid_img = mmcv.imcrop(raw_img, xyxy)
-            mmcv.imwrite(reid_img, f'{reid_img_folder}/{reid_img_name}')
+def write_reid_shards(base_path, video_names, shard_folder, vis_threshold, num_shards, crop_size, workers):
+    # Crops resized to crop_size (width, height) in num_shards uint8 arrays of
+    # shape (n, height, width, 3). Videos are assigned to shards in order,
+    # balanced by crop count, and the shards are allocated up front. Returns
+    # {identity: ['<shard>:<row>', ...]} and writes the same as index.txt.
+    os.makedirs(shard_folder)
+    counts = {}
+    for video_name in sorted(video_names):
+        rows = load_video_rows(base_path, video_name, vis_threshold)
+        if rows is not None and len(rows):
+            counts[video_name] = len(rows)
+    total = sum(counts.values())
+    num_shards = max(min(num_shards, len(counts)), 1)
+    jobs = []
+    shard_sizes = [0] * num_shards
+    done = 0
+    for video_name, count in counts.items():
+        k = min(done * num_shards // max(total, 1), num_shards - 1)
+        jobs.append((video_name, f'shard_{k:03d}.npy', shard_sizes[k]))
+        shard_sizes[k] += count
+        done += count
+    width, height = crop_size
+    for k, size in enumerate(shard_sizes):
+        np.lib.format.open_memmap(osp.join(shard_folder, f'shard_{k:03d}.npy'), mode='w+', dtype=np.uint8,
+                                  shape=(size, height, width, 3)).flush()
 
-    # Create training and validation lists
-    split_data_into_train_val(output_path, reid_train_folder, val_split, min_object, max_object)
+    identities = defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(crop_video_to_shard, base_path, video_name, vis_threshold, osp.join(shard_folder, shard), start,
+                        crop_size): (video_name, shard, start)
+            for video_name, shard, start in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            video_name, shard, start = futures[future]
+            for i, ins_id in enumerate(future.result()):
+                identities[f'{video_name}_{ins_id:06d}'].append(f'{shard}:{start + i}')
+    with open(osp.join(shard_folder, 'index.txt'), 'w') as f:
+        for name in sorted(identities):
+            f.writelines(f'{name} {entry}\n' for entry in identities[name])
+    return identities
 
-def split_data_into_train_val(output_path, reid_train_folder, val_split, min_object, max_object):
+def split_data_into_train_val(output_path, identities, val_split, min_object, max_object):
+    # identities: {identity name: [image entries relative to the data prefix]}
     reid_meta_folder = osp.join(output_path, 'meta')
     os.makedirs(reid_meta_folder, exist_ok=True)
     reid_train_list, reid_val_list, reid_entire_dataset_list = [], [], []
-    reid_img_folder_names = sorted(os.listdir(reid_train_folder))
+    reid_img_folder_names = sorted(identities)
     num_ids = len(reid_img_folder_names)
     num_train_ids = int(num_ids * (1 - val_split))
     train_label, val_label = 0, 0
@@ -75,24 +168,24 @@ def split_data_into_train_val(output_path, reid_train_folder, val_split, min_obj
     random.seed(0)
 
     for reid_img_folder_name in reid_img_folder_names[:num_train_ids]:
-        reid_img_names = os.listdir(osp.join(reid_train_folder, reid_img_folder_name))
+        reid_img_names = identities[reid_img_folder_name]
         if len(reid_img_names) < min_object:
             continue
         if len(reid_img_names) > max_object:
             reid_img_names = random.sample(reid_img_names, max_object)
         for reid_img_name in reid_img_names:
-            reid_train_list.append(f'{reid_img_folder_name}/{reid_img_name} {train_label}\n')
+            reid_train_list.append(f'{reid_img_name} {train_label}\n')
         train_label += 1
 
     for reid_img_folder_name in reid_img_folder_names[num_train_ids:]:
-        reid_img_names = os.listdir(osp.join(reid_train_folder, reid_img_folder_name))
+        reid_img_names = identities[reid_img_folder_name]
         if len(reid_img_names) < min_object:
             continue
         if len(reid_img_names) > max_object:
             reid_img_names = random.sample(reid_img_names, max_object)
         for reid_img_name in reid_img_names:
-            reid_val_list.append(f'{reid_img_folder_name}/{reid_img_name} {val_label}\n')
-            reid_entire_dataset_list.append(f'{reid_img_folder_name}/{reid_img_name} {train_label + val_label}\n')
+            reid_val_list.append(f'{reid_img_name} {val_label}\n')
+            reid_entire_dataset_list.append(f'{reid_img_name} {train_label + val_label}\n')
         val_label += 1
 
     with open(osp.join(reid_meta_folder, f'train_{int(100 * (1 - val_split))}.txt'), 'w') as f:
@@ -0,0 +1,156 @@
+import os
+import os.path as osp
+
+import numpy as np
+import torch
+from torch import nn
+from model_loader import BACKENDS
+
+EXTENSIONS = dict(torchscript='.pt', onnxruntime='.onnx')
+ONNX_OPSET = 11
+
+
+# The dense, NMS-free parts of DeepSORT as standalone modules: the detector's
+# backbone + FPN and the ReID embedding network. RPN/RoI heads (NMS, RoIAlign)
+# and the SortTracker keep running in PyTorch.
+class DetectorFeatures(nn.Module):
+    def __init__(self, detector):
+        super().__init__()
+        self.detector = detector
+
+    def forward(self, img):
+        return tuple(self.detector.extract_feat(img))
+
+
+class ReIDEmbedding(nn.Module):
+    def __init__(self, reid):
+        super().__init__()
+        self.reid = reid
+
+    def forward(self, img):
+        return self.reid.simple_test(img)
+
+
+def backend_paths(backend_dir, backend):
+    extension = EXTENSIONS[backend]
+    return osp.join(backend_dir, 'detector' + extension), osp.join(backend_dir, 'reid' + extension)
+
+
+def reid_input_size(model):
+    # (height, width) of the crops the tracker feeds to the ReID
+    return tuple(model.tracker.reid.get('img_scale', (256, 128)))
+
+
+def export_backend(model, backend, backend_dir, det_input_size=(480, 800)):
+    # det_input_size is the padded network input for a 1280x720 frame with the
+    # (800, 800) keep-ratio test resize; other sizes work through dynamic axes.
+    if backend not in EXTENSIONS:
+        raise ValueError(f'backend must be one of {tuple(EXTENSIONS)}, got {backend!r}')
+    os.makedirs(backend_dir, exist_ok=True)
+    model = model.cpu().eval()
+    det_path, reid_path = backend_paths(backend_dir, backend)
+    image_axes = {0: 'batch', 2: 'height', 3: 'width'}
+    # (module, example input, path, dynamic axes of the input, of each output)
+    exports = [
+        (DetectorFeatures(model.detector), torch.randn(1, 3, *det_input_size), det_path, image_axes, image_axes),
+        (ReIDEmbedding(model.reid), torch.randn(2, 3, *reid_input_size(model)), reid_path, {0: 'batch'}, {0: 'batch'}),
+    ]
+    with torch.no_grad():
+        for module, example, path, input_axes, output_axes in exports:
+            if backend == 'torchscript':
+                torch.jit.save(torch.jit.trace(module, example), path)
+                continue
+            outputs = module(example)
+            num_outputs = len(outputs) if isinstance(outputs, tuple) else 1
+            output_names = [f'out{i}' for i in range(num_outputs)]
+            dynamic_axes = dict(img=input_axes, **{name: output_axes for name in output_names})
+            torch.onnx.export(module, example, path, input_names=['img'], output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+    return det_path, reid_path
+
+
+class TorchScriptRunner:
+    def __init__(self, path, num_threads=None):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        module = torch.jit.load(path, map_location='cpu').eval()
+        try:
+            self.module = torch.jit.optimize_for_inference(module)
+        except RuntimeError:
+            # e.g. quantized modules written by quantize_reid.py
+            self.module = torch.jit.freeze(module)
+
+    def __call__(self, img):
+        with torch.no_grad():
+            outputs = self.module(img.cpu())
+        outputs = outputs if isinstance(outputs, tuple) else (outputs, )
+        return [output.to(img.device) for output in outputs]
+
+
+class OnnxRuntimeRunner:
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, img):
+        inputs = np.ascontiguousarray(img.detach().cpu().numpy(), dtype=np.float32)
+        outputs = self.session.run(None, {'img': inputs})
+        return [torch.from_numpy(output).to(img.device) for output in outputs]
+
+
+def make_runner(backend, path, num_threads=None):
+    if not osp.exists(path):
+        raise FileNotFoundError(f'{path} not found; export it with tools/export_backend.py --backend {backend}')
+    if backend == 'torchscript':
+        return TorchScriptRunner(path, num_threads)
+    return OnnxRuntimeRunner(path, num_threads)
+
+
+def apply_backend(model, backend='pytorch', backend_dir=None, num_threads=None):
+    # Routes model.detector.extract_feat and model.reid.simple_test through the
+    # networks exported to backend_dir; a network without a file there stays in
+    # PyTorch. inference_mot, MOTRunner and the SortTracker are used unchanged
+    # and produce the same result structure. Returns a function that restores
+    # the eager PyTorch methods.
+    if backend not in BACKENDS:
+        raise ValueError(f'backend must be one of {BACKENDS}, got {backend!r}')
+    if backend == 'pytorch':
+        return lambda: None
+    if backend_dir is None:
+        raise ValueError(f'--backend-dir is required for the {backend} backend')
+    det_path, reid_path = backend_paths(backend_dir, backend)
+    if not (osp.exists(det_path) or osp.exists(reid_path)):
+        raise FileNotFoundError(f'Neither {det_path} nor {reid_path} exists; export them with tools/export_backend.py')
+    patched = []
+
+    # instance attributes shadow the class methods
+    if osp.exists(det_path):
+        detector_runner = make_runner(backend, det_path, num_threads)
+
+        def extract_feat(img):
+            return tuple(detector_runner(img))
+
+        model.detector.extract_feat = extract_feat
+        patched.append((model.detector, 'extract_feat'))
+
+    if osp.exists(reid_path):
+        reid_runner = make_runner(backend, reid_path, num_threads)
+        embed_channels = model.reid.head.out_channels
+
+        def reid_simple_test(img, **kwargs):
+            if img.nelement() == 0:
+                return img.new_zeros(0, embed_channels)
+            return reid_runner(img)[0]
+
+        model.reid.simple_test = reid_simple_test
+        patched.append((model.reid, 'simple_test'))
+
+    def restore():
+        for module, name in patched:
+            delattr(module, name)
+
+    return restore
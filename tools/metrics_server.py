@@ -0,0 +1,296 @@
+import abc
+import bisect
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+# A single time series. The value is either kept here or, when a function is
+# set, read from the function at scrape time, so the hot path pays nothing.
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._fn = None
+
+    def set_function(self, fn):
+        self._fn = fn
+
+    def get(self):
+        return float(self._fn()) if self._fn is not None else self._value
+
+
+class _CounterValue(_Value):
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError('Counters can only be incremented')
+        with self._lock:
+            self._value += amount
+
+
+class _GaugeValue(_Value):
+    def set(self, value):
+        self._value = float(value)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), counts):
+            cumulative += count
+            yield '_bucket', dict(le=_format_value(bound)), cumulative
+        yield '_sum', {}, total
+        yield '_count', {}, cumulative
+
+
+# A named metric with optional labels, in the Prometheus text format. Without
+# labelnames the metric has a single child used through the metric itself,
+# e.g. counter.inc(); with labelnames children are created on demand, e.g.
+# gauge.labels('reader').set(3). Subclasses create the children.
+class _Metric(abc.ABC):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            # exported as 0 before the first update
+            self.labels()
+        if registry is not None:
+            registry.register(self)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        pass
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {values}')
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def set_function(self, fn):
+        self.labels().set_function(fn)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            if isinstance(child, _HistogramValue):
+                for suffix, extra, value in child.samples():
+                    yield self.name + suffix, dict(labels, **extra), value
+            else:
+                yield self.name, labels, child.get()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+# Serves registry.render() on /metrics from a background thread. Metrics are
+# only formatted when scraped.
+class MetricsServer:
+    def __init__(self, registry, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+# The metric set shared by the real-time tools. Per frame the tools call
+# frame_done(), set_tracks() and time stages with stage(); queue depths, dropped
+# frames, FPS and label counts are read through functions at scrape time.
+class PipelineMetrics:
+    def __init__(self, port, host='127.0.0.1', fps_window=10.0, prefix='mot'):
+        self.registry = Registry()
+        self.fps_window = fps_window
+        self._frame_times = collections.deque(maxlen=4096)
+
+        self.frames = Counter(f'{prefix}_frames_processed_total', 'Frames processed.', registry=self.registry)
+        self.fps = Gauge(f'{prefix}_fps', 'FPS over the last frame interval.', registry=self.registry)
+        self.rolling_fps = Gauge(f'{prefix}_rolling_fps', f'FPS over the last {fps_window:g} seconds.', registry=self.registry)
+        self.stage_seconds = Histogram(f'{prefix}_stage_latency_seconds', 'Latency of each pipeline stage.',
+                                       labelnames=('stage', ), registry=self.registry)
+        self.queue_depth = Gauge(f'{prefix}_queue_depth', 'Items waiting in each queue.',
+                                 labelnames=('queue', ), registry=self.registry)
+        self.dropped_frames = Counter(f'{prefix}_dropped_frames_total', 'Frames dropped by each component.',
+                                      labelnames=('source', ), registry=self.registry)
+        self.active_tracks = Gauge(f'{prefix}_active_tracks', 'Tracks in the latest frame.', registry=self.registry)
+        self.label_count = Gauge(f'{prefix}_label_count', 'Objects counted per label.',
+                                 labelnames=('label', ), registry=self.registry)
+
+        self.fps.set_function(self._current_fps)
+        self.rolling_fps.set_function(self._rolling_fps)
+        self.server = MetricsServer(self.registry, port, host)
+
+    def _current_fps(self):
+        times = list(self._frame_times)[-2:]
+        return 1.0 / (times[1] - times[0]) if len(times) == 2 and times[1] > times[0] else 0.0
+
+    def _rolling_fps(self):
+        times = list(self._frame_times)
+        if len(times) < 2:
+            return 0.0
+        start = bisect.bisect_left(times, times[-1] - self.fps_window)
+        start = min(start, len(times) - 2)
+        return (len(times) - 1 - start) / max(times[-1] - times[start], 1e-9)
+
+    def frame_done(self):
+        self._frame_times.append(time.perf_counter())
+        self.frames.inc()
+
+    def set_tracks(self, num_tracks):
+        self.active_tracks.set(num_tracks)
+
+    def stage(self, name):
+        return self.stage_seconds.labels(name).time()
+
+    def watch_queue(self, name, q):
+        self.queue_depth.labels(name).set_function(q.qsize)
+
+    def watch_dropped(self, name, component):
+        self.dropped_frames.labels(name).set_function(lambda: component.dropped)
+
+    def watch_counts(self, counts, labels):
+        for label in labels:
+            self.label_count.labels(label).set_function(lambda label=label: counts.get(label, 0))
+
+    def close(self):
+        self.server.close()
@@ -0,0 +1,114 @@
+import os.path as osp
+import time
+
+# torch, mmcv and mmtrack are imported inside the functions so that argument
+# parsing and --help do not pay for them.
+
+ARTIFACT_VERSION = 1
+ARTIFACT_EXTENSIONS = ('.pth', '.pt')
+BACKENDS = ('pytorch', 'torchscript', 'onnxruntime')
+
+
+def add_model_args(parser, config_flag='--config'):
+    parser.add_argument(config_flag, help='Path to the MOT model configuration file.')
+    parser.add_argument('--detector-checkpoint', help='Path to the detector model checkpoint.')
+    parser.add_argument('--reid-checkpoint', help='Path to the re-identification model checkpoint.')
+    parser.add_argument('--artifact', help='Model artifact written by tools/export_model.py. Replaces the config and checkpoints.')
+    parser.add_argument('--backend', choices=BACKENDS, default='pytorch', help='Runtime for the detector backbone/FPN and the ReID network.')
+    parser.add_argument('--backend-dir', help='Directory with the networks exported by tools/export_backend.py.')
+
+
+def model_source(artifact=None, config=None, detector_checkpoint=None, reid_checkpoint=None):
+    # What load_mot_model() should load: the artifact, or the config with our
+    # checkpoints in place of the init_cfg URLs.
+    if artifact:
+        return artifact
+    if not (config and detector_checkpoint and reid_checkpoint):
+        raise ValueError('Either --artifact or a config with --detector-checkpoint and --reid-checkpoint is required')
+    import mmcv
+    cfg = mmcv.Config.fromfile(config)
+    cfg.model.detector.init_cfg.checkpoint = detector_checkpoint
+    cfg.model.reid.init_cfg.checkpoint = reid_checkpoint
+    return cfg
+
+
+def is_artifact(path):
+    return isinstance(path, str) and osp.splitext(path)[1] in ARTIFACT_EXTENSIONS
+
+
+def strip_init_cfg(cfg):
+    # Drops init_cfg / pretrained entries so building the model never loads or
+    # downloads weights.
+    if isinstance(cfg, dict):
+        return {k: strip_init_cfg(v) for k, v in cfg.items() if k not in ('init_cfg', 'pretrained')}
+    if isinstance(cfg, (list, tuple)):
+        return type(cfg)(strip_init_cfg(v) for v in cfg)
+    return cfg
+
+
+def export_artifact(mot_config, out_path, warmup_shape=(720, 1280)):
+    # Builds the model once the slow way (config inheritance + init_cfg
+    # checkpoints) and saves the resolved config together with all weights.
+    import torch
+    from mmtrack.apis import init_model
+    model = init_model(mot_config, device='cpu')
+    artifact = dict(
+        version=ARTIFACT_VERSION,
+        config=strip_init_cfg(model.cfg._cfg_dict.to_dict()),
+        state_dict=model.state_dict(),
+        meta=dict(
+            CLASSES=model.CLASSES,
+            source_config=model.cfg.filename,
+            detector_checkpoint=model.cfg.model.detector.init_cfg.checkpoint,
+            reid_checkpoint=model.cfg.model.reid.init_cfg.checkpoint,
+            warmup_shape=tuple(warmup_shape),
+            created=time.strftime('%Y-%m-%d %H:%M:%S')))
+    torch.save(artifact, out_path)
+    return out_path
+
+
+def warm_up(model, shape=(720, 1280), iterations=1):
+    # Runs blank frames through the model so lazy CUDA/cuDNN setup and the first
+    # allocations happen before the first real frame, then resets the tracker.
+    import numpy as np
+    from mmtrack.apis import inference_mot
+    img = np.zeros((shape[0], shape[1], 3), dtype=np.uint8)
+    for frame_id in range(iterations):
+        inference_mot(model, img, frame_id=frame_id)
+    model.tracker.reset()
+
+
+def load_artifact(path, device='cuda:0', warmup=True, backend='pytorch', backend_dir=None):
+    import mmcv
+    import torch
+    from mmtrack.models import build_model
+    from inference_backend import apply_backend
+    artifact = torch.load(path, map_location='cpu')
+    if artifact.get('version') != ARTIFACT_VERSION:
+        raise ValueError(f'{path} is not a model artifact of version {ARTIFACT_VERSION}')
+    cfg = mmcv.Config(artifact['config'], filename=path)
+    if cfg.get('custom_imports'):
+        mmcv.utils.import_modules_from_strings(**cfg.custom_imports)
+
+    # All weights come from the artifact, so init_weights() is never called.
+    model = build_model(cfg.model)
+    model.load_state_dict(artifact['state_dict'])
+    model.CLASSES = artifact['meta']['CLASSES']
+    model.cfg = cfg
+    model.to(device)
+    model.eval()
+    apply_backend(model, backend, backend_dir)
+    if warmup:
+        warm_up(model, artifact['meta'].get('warmup_shape', (720, 1280)))
+    return model
+
+
+def load_mot_model(mot_config, device='cuda:0', warmup=True, backend='pytorch', backend_dir=None):
+    # mot_config: an artifact path, or a config (path or mmcv.Config) for init_model.
+    if is_artifact(mot_config):
+        return load_artifact(mot_config, device, warmup, backend, backend_dir)
+    from mmtrack.apis import init_model
+    from inference_backend import apply_backend
+    model = init_model(mot_config, device=device)
+    apply_backend(model, backend, backend_dir)
+    return model
@@ -0,0 +1,215 @@
+import copy
+
+import numpy as np
+
+# torch, mmcv, mmdet and mmtrack are imported inside the functions, like in
+# model_loader.py, so the tools importing MOTRunner start without them.
+
+
+def build_test_pipeline(cfg):
+    from mmdet.datasets.pipelines import Compose
+    cfg = cfg.copy()
+    # frames are passed as arrays, not file names
+    cfg.data.test.pipeline[0].type = 'LoadImageFromWebcam'
+    return Compose(cfg.data.test.pipeline)
+
+
+def prepare_batch(model, pipeline, imgs, frame_ids):
+    from mmcv.parallel import collate, scatter
+    datas = [pipeline(dict(img=img, img_info=dict(frame_id=frame_id), img_prefix=None))
+             for img, frame_id in zip(imgs, frame_ids)]
+    data = collate(datas, samples_per_gpu=len(datas))
+    device = next(model.parameters()).device
+    if device.type == 'cuda':
+        data = scatter(data, [device])[0]
+    else:
+        data['img_metas'] = data['img_metas'][0].data
+    # the test pipeline wraps everything in a list of (single) augmentations
+    return data['img'][0], data['img_metas'][0]
+
+
+def detect_batch(model, img, img_metas):
+    import torch
+    detector = model.detector
+    with torch.no_grad():
+        feats = detector.extract_feat(img)
+        proposals = detector.rpn_head.simple_test_rpn(feats, img_metas)
+        det_bboxes, det_labels = detector.roi_head.simple_test_bboxes(
+            feats, img_metas, proposals, detector.roi_head.test_cfg, rescale=True)
+    return feats, det_bboxes, det_labels
+
+
+def track_frame(model, img, img_metas, feats, det_bboxes, det_labels, frame_id):
+    # Same steps as DeepSORT.simple_test after the detector has run.
+    import torch
+    from mmtrack.core import outs2results
+    if frame_id == 0:
+        model.tracker.reset()
+    with torch.no_grad():
+        track_bboxes, track_labels, track_ids = model.tracker.track(
+            img=img,
+            img_metas=img_metas,
+            model=model,
+            feats=feats,
+            bboxes=det_bboxes,
+            labels=det_labels,
+            frame_id=frame_id,
+            rescale=True)
+    num_classes = model.detector.roi_head.bbox_head.num_classes
+    track_results = outs2results(
+        bboxes=track_bboxes, labels=track_labels, ids=track_ids, num_classes=num_classes)
+    det_results = outs2results(bboxes=det_bboxes, labels=det_labels, num_classes=num_classes)
+    return dict(det_bboxes=det_results['bbox_results'], track_bboxes=track_results['bbox_results'])
+
+
+def iter_inference_mot_batch(model, imgs, frame_ids, pipeline=None):
+    # Runs the detector once over all frames, then feeds the tracker frame by
+    # frame in order so the results match calling inference_mot sequentially.
+    # Tracking of frame i only happens when result i is requested.
+    if pipeline is None:
+        pipeline = build_test_pipeline(model.cfg)
+    img, img_metas = prepare_batch(model, pipeline, imgs, frame_ids)
+    feats, det_bboxes, det_labels = detect_batch(model, img, img_metas)
+
+    for i, frame_id in enumerate(frame_ids):
+        yield track_frame(
+            model, img[i:i + 1], [img_metas[i]], [feat[i:i + 1] for feat in feats],
+            det_bboxes[i], det_labels[i], frame_id)
+
+
+def inference_mot_batch(model, imgs, frame_ids, pipeline=None):
+    return list(iter_inference_mot_batch(model, imgs, frame_ids, pipeline))
+
+
+def predict_tracks(model, result, fraction):
+    # Moves the tracks of `result` forward by `fraction` of a tracker step using
+    # the constant-velocity Kalman state (cx, cy, a, h, vx, vy, va, vh) that the
+    # SortTracker keeps per track. The tracker state itself is left untouched.
+    tracks = model.tracker.tracks
+    track_bboxes = []
+    for class_bboxes in result['track_bboxes']:
+        keep = np.array([int(track_id) in tracks for track_id in class_bboxes[:, 0]], dtype=bool)
+        class_bboxes = class_bboxes[keep].copy()
+        if len(class_bboxes):
+            means = np.stack([tracks[int(track_id)].mean for track_id in class_bboxes[:, 0]])
+            cx, cy, aspect_ratio, height = (means[:, :4] + fraction * means[:, 4:8]).T
+            width = aspect_ratio * height
+            class_bboxes[:, 1:5] = np.stack(
+                [cx - width / 2, cy - height / 2, cx + width / 2, cy + height / 2], axis=1)
+        track_bboxes.append(class_bboxes)
+    det_bboxes = [np.zeros((0, 5), dtype=np.float32) for _ in result['det_bboxes']]
+    return dict(det_bboxes=det_bboxes, track_bboxes=track_bboxes)
+
+
+# Buffers incoming frames and runs them through the model in batches of
+# `batch_size` detection frames. With det_interval K > 1 only every K-th frame
+# goes through the detector, ReID and tracker (which sees them as consecutive
+# steps); the frames in between get the tracks' Kalman predictions. With a
+# RegionOfInterest only the cropped ROI is processed and the boxes are mapped
+# back to the full frame. push()/flush() return (frame_id, frame, result) in
+# input order.
+class MOTRunner:
+    def __init__(self, model, batch_size=1, det_interval=1, roi=None):
+        self.model = model
+        self.batch_size = max(int(batch_size), 1)
+        self.det_interval = max(int(det_interval), 1)
+        self.roi = roi
+        self.pipeline = build_test_pipeline(model.cfg) if self.batch_size > 1 else None
+        self._pending = []
+        self._num_pending_keys = 0
+        self._last_key = None
+        self._roi_frame_shape = None
+
+    def is_key_frame(self, frame_id):
+        return frame_id % self.det_interval == 0
+
+    def push(self, frame_id, frame):
+        if not self.is_key_frame(frame_id) and self._num_pending_keys == 0:
+            # the tracker state is already at the preceding detection frame
+            return [(frame_id, frame, self._output(self._predict(frame_id)))]
+        self._pending.append((frame_id, frame, self._input(frame) if self.is_key_frame(frame_id) else None))
+        if self.is_key_frame(frame_id):
+            self._num_pending_keys += 1
+        if self._num_pending_keys >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self._num_pending_keys = 0
+        key_results = self._iter_key_results([item for item in pending if self.is_key_frame(item[0])])
+        outputs = []
+        for frame_id, frame, _ in pending:
+            if self.is_key_frame(frame_id):
+                result = next(key_results)
+                self._last_key = (frame_id, result)
+            else:
+                result = self._predict(frame_id)
+            outputs.append((frame_id, frame, self._output(result)))
+        return outputs
+
+    def _input(self, frame):
+        # what the model sees of a detection frame
+        if self.roi is None:
+            return frame
+        if self._roi_frame_shape != frame.shape[:2]:
+            self._roi_frame_shape = frame.shape[:2]
+            self.roi.fit(self.model.cfg, frame.shape)
+            if self.pipeline is not None:
+                self.pipeline = build_test_pipeline(self.model.cfg)
+        return self.roi.crop(frame)
+
+    def _output(self, result):
+        return result if self.roi is None else self.roi.to_frame(result)
+
+    def _iter_key_results(self, keys):
+        if not keys:
+            return
+        tracker_frame_ids = [frame_id // self.det_interval for frame_id, _, _ in keys]
+        if self.batch_size == 1:
+            from mmtrack.apis import inference_mot
+            for (_, _, frame), tracker_frame_id in zip(keys, tracker_frame_ids):
+                yield inference_mot(self.model, frame, frame_id=tracker_frame_id)
+        else:
+            frames = [frame for _, _, frame in keys]
+            yield from iter_inference_mot_batch(self.model, frames, tracker_frame_ids, self.pipeline)
+
+    def _predict(self, frame_id):
+        if self._last_key is None:
+            num_classes = self.model.detector.roi_head.bbox_head.num_classes
+            return dict(det_bboxes=[np.zeros((0, 5), dtype=np.float32)] * num_classes,
+                        track_bboxes=[np.zeros((0, 6), dtype=np.float32)] * num_classes)
+        key_frame_id, key_result = self._last_key
+        return predict_tracks(self.model, key_result, (frame_id - key_frame_id) / self.det_interval)
+
+
+# Tracks several independent streams with one model. Each stream gets its own
+# copy of model.tracker, which is swapped in while that stream's frames are
+# associated; the detector runs once over frames of all streams in a batch.
+class MultiStreamRunner:
+    def __init__(self, model, num_streams):
+        self.model = model
+        self.pipeline = build_test_pipeline(model.cfg)
+        self.trackers = [copy.deepcopy(model.tracker) for _ in range(num_streams)]
+
+    def step(self, items):
+        # items: (stream_index, frame_id, frame) with at most one frame per
+        # stream; returns the results in the same order.
+        if not items:
+            return []
+        frames = [frame for _, _, frame in items]
+        frame_ids = [frame_id for _, frame_id, _ in items]
+        img, img_metas = prepare_batch(self.model, self.pipeline, frames, frame_ids)
+        feats, det_bboxes, det_labels = detect_batch(self.model, img, img_metas)
+
+        shared_tracker = self.model.tracker
+        results = []
+        try:
+            for i, (stream, frame_id, _) in enumerate(items):
+                self.model.tracker = self.trackers[stream]
+                results.append(track_frame(
+                    self.model, img[i:i + 1], [img_metas[i]], [feat[i:i + 1] for feat in feats],
+                    det_bboxes[i], det_labels[i], frame_id))
+        finally:
+            self.model.tracker = shared_tracker
+        return results
@@ -0,0 +1,122 @@
+import argparse
+import os
+import time
+from counting import CrossingCounter, Line, parse_line, parse_zone, track_array
+from model_loader import add_model_args, load_mot_model, model_source
+from mot_inference import MultiStreamRunner
+from video_stream import FrameReader, FrameWriter
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Track objects on several video streams with a single model.')
+    parser.add_argument('--source', action='append', required=True, help='Camera id, video file or image directory. Repeat once per stream.')
+    add_model_args(parser, '--mot-config-path')
+    parser.add_argument('--device', default='cuda:0', help='Device to use for computation.')
+    parser.add_argument('--batch-size', type=int, help='Maximum number of frames (one per stream) the detector processes together (default: number of streams).')
+    parser.add_argument('--output-dir', help='Write a rendered video per stream to this directory.')
+    parser.add_argument('--fps', type=int, default=30, help='Frames per second of the output videos.')
+    parser.add_argument('--line', action='append', default=[], help='Counting line as x1,y1,x2,y2[,any|positive|negative], applied to every stream. Can be repeated; defaults to the horizontal middle line.')
+    parser.add_argument('--zone', action='append', default=[], help='Counting zone as polygon vertices x1,y1,x2,y2,x3,y3,..., applied to every stream. Can be repeated.')
+    parser.add_argument('--queue-size', type=int, default=8, help='Maximum number of frames buffered per stream.')
+    return parser.parse_args()
+
+
+# Per-stream state: the reader, counting regions and optional output writer.
+# Tracker state lives in MultiStreamRunner.
+class Stream:
+    def __init__(self, index, source, regions, queue_size, output_path=None, fps=30):
+        self.index = index
+        self.source = source
+        is_camera = isinstance(source, int) or str(source).isdigit()
+        # live cameras keep only the newest frames, files are read completely
+        self.reader = FrameReader(source, max_queue=queue_size, drop_oldest=is_camera)
+        self.writer = FrameWriter(output_path, fps=fps, max_queue=queue_size) if output_path else None
+        self.counter = CrossingCounter(regions) if regions else None
+        self.num_frames = 0
+
+    def handle(self, model, img, result):
+        if self.counter is None:
+            # Count objects whose box touches the middle line
+            mid_line_y = img.shape[0] // 2
+            self.counter = CrossingCounter([Line((0, mid_line_y), (img.shape[1], mid_line_y), trigger='touch', name='middle line')])
+        self.counter.update(track_array(result))
+        if self.writer is not None:
+            self.writer.write(model.show_result(img, result, show=False))
+        self.num_frames += 1
+
+    def close(self):
+        self.reader.stop()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def next_batch(streams, batch_size, start, wait=0.01):
+    # Takes at most one frame per stream, visiting the streams round-robin from
+    # `start` so every stream gets a turn when batch_size < len(streams).
+    batch = []
+    active = [stream for stream in streams[start:] + streams[:start] if not stream.reader.finished]
+    for stream in active:
+        if len(batch) >= batch_size:
+            break
+        item = stream.reader.read(timeout=0)
+        if item is not None:
+            batch.append((stream, item))
+    if not batch and active:
+        # nothing decoded yet: block briefly on the first waiting stream
+        item = active[0].reader.read(timeout=wait)
+        if item is not None:
+            batch.append((active[0], item))
+    return batch
+
+
+def process_streams(sources, mot_config, device='cuda:0', batch_size=None, output_dir=None, fps=30,
+                    regions=None, queue_size=8, backend='pytorch', backend_dir=None):
+    # The detector and ReID weights are loaded once and shared by all streams.
+    mot_model = load_mot_model(mot_config, device, backend=backend, backend_dir=backend_dir)
+    runner = MultiStreamRunner(mot_model, len(sources))
+    batch_size = batch_size or len(sources)
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    streams = [
+        Stream(i, source, regions, queue_size,
+               os.path.join(output_dir, f'stream_{i}.mp4') if output_dir else None, fps)
+        for i, source in enumerate(sources)]
+
+    num_batches = 0
+    start_time = time.time()
+    try:
+        while any(not stream.reader.finished for stream in streams):
+            batch = next_batch(streams, batch_size, num_batches % len(streams))
+            if not batch:
+                continue
+            # the tracker needs consecutive frame ids; cameras may have dropped frames
+            items = [(stream.index, stream.num_frames, frame) for stream, (_, frame) in batch]
+            for (stream, (_, frame)), result in zip(batch, runner.step(items)):
+                stream.handle(mot_model, frame, result)
+            num_batches += 1
+    except KeyboardInterrupt:
+        print('\nStopping.')
+    finally:
+        for stream in streams:
+            stream.close()
+
+    elapsed_time = time.time() - start_time
+    num_frames = sum(stream.num_frames for stream in streams)
+    print(f'\nProcessed {num_frames} frames from {len(streams)} streams in {elapsed_time:.1f}s '
+          f'({num_frames / max(elapsed_time, 1e-6):.2f} FPS in total, '
+          f'{num_frames / max(num_batches, 1):.2f} frames per detector batch)')
+    stream_counts = []
+    for stream in streams:
+        counts = stream.counter.counts if stream.counter is not None else {}
+        print(f'\nStream {stream.index} ({stream.source}): {stream.num_frames} frames, '
+              f'{sum(counts.values())} objects counted {counts}')
+        stream_counts.append(counts)
+    return stream_counts
+
+if __name__ == '__main__':
+    args = parse_args()
+    mot_config = model_source(args.artifact, args.mot_config_path, args.detector_checkpoint, args.reid_checkpoint)
+
+    process_streams(args.source, mot_config, args.device, args.batch_size, args.output_dir, args.fps,
+                    [parse_line(spec) for spec in args.line] + [parse_zone(spec) for spec in args.zone],
+                    args.queue_size, args.backend, args.backend_dir)
@@ -1,45 +1,94 @@
 import argparse
-import cv2
-import mmcv
-from mmtrack.apis import inference_mot, init_model
+import time
+from contextlib import nullcontext
+from async_output import LOG_FORMATS, AsyncDisplay, RecordLogger
+from counting import track_array
+from metrics_server import PipelineMetrics
+from model_loader import add_model_args, load_mot_model, model_source
+from mot_inference import MOTRunner
+from roi import add_roi_args, parse_roi
+from video_stream import FrameReader
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Real-time object tracking from webcam using an MOT model.')
-    parser.add_argument('--mot-config-path', required=True, help='Path to the MOT model configuration file.')
-    parser.add_argument('--detector-checkpoint', required=True, help='Path to the detector model checkpoint.')
-    parser.add_argument('--reid-checkpoint', required=True, help='Path to the re-identification model checkpoint.')
+    add_model_args(parser, '--mot-config-path')
     parser.add_argument('--device', default='cuda:0', help='Device to use for computation.')
     parser.add_argument('--camera-id', type=int, default=0, help='ID of the webcam device.')
+    parser.add_argument('--headless', action='store_true', help='Do not open a display window.')
+    parser.add_argument('--log-file', help='File to save structured tracking records to.')
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='jsonl', help='Log record format.')
+    parser.add_argument('--log-every', type=int, default=30, help='Write a record at least every N frames even if nothing changed.')
+    add_roi_args(parser)
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port.')
+    parser.add_argument('--metrics-host', default='127.0.0.1', help='Address the metrics endpoint binds to.')
     return parser.parse_args()
 
-def display_from_cam(mot_config, device='cuda:0', camera_id=0):
-    cap = cv2.VideoCapture(camera_id)
-    if not cap.isOpened():
+def display_from_cam(mot_config, device='cuda:0', camera_id=0, headless=False, log_file=None, log_format='jsonl', log_every=30,
+                     metrics_port=None, metrics_host='127.0.0.1', backend='pytorch', backend_dir=None, roi=None):
+    try:
+        # Capture runs on its own thread and keeps only the newest frames.
+        reader = FrameReader(camera_id, max_queue=2, drop_oldest=True)
+    except IOError:
         print("Error: Could not open webcam.")
         return
 
-    mot_model = init_model(mot_config, device=device)
+    mot_model = load_mot_model(mot_config, device, backend=backend, backend_dir=backend_dir)
+    runner = MOTRunner(mot_model, roi=roi)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to capture frame from webcam.")
-            break
+    logger = RecordLogger(log_file, fmt=log_format, every=log_every) if log_file else None
+    display = None if headless else AsyncDisplay('Webcam - MOT Tracking')
+
+    # Optional Prometheus endpoint; gauges backed by functions cost nothing per frame
+    metrics = PipelineMetrics(metrics_port, metrics_host) if metrics_port else None
+    if metrics is not None:
+        metrics.watch_queue('reader', reader.queue)
+        metrics.watch_dropped('reader', reader)
+        if logger is not None:
+            metrics.watch_queue('log', logger.queue)
+        if display is not None:
+            metrics.watch_queue('display', display.queue)
+            metrics.watch_dropped('display', display)
+    timed = metrics.stage if metrics is not None else (lambda name: nullcontext())
+    start_time = time.time()
 
-        result = inference_mot(mot_model, frame, frame_id=int(cap.get(cv2.CAP_PROP_POS_FRAMES)))
-        img_with_results = mot_model.show_result(frame, result, show=False, wait_time=1, out_file=None)
+    try:
+        for frame_id, frame in reader:
+            with timed('inference'):
+                # one frame in, one result out with the default batch size and interval
+                (_, _, result), = runner.push(frame_id, frame)
+            num_tracks = len(track_array(result))
+            if metrics is not None:
+                metrics.set_tracks(num_tracks)
+                metrics.frame_done()
 
-        cv2.imshow('Webcam - MOT Tracking', img_with_results)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            if logger is not None:
+                logger.update(dict(
+                    frame=frame_id + 1,
+                    time=round(time.time() - start_time, 3),
+                    tracks=num_tracks))
 
-    cap.release()
-    cv2.destroyAllWindows()
+            if display is not None:
+                with timed('render'):
+                    rendered = mot_model.show_result(frame, result, show=False, wait_time=1, out_file=None)
+                    if roi is not None:
+                        roi.draw(rendered)
+                display.show(rendered)
+                if display.quit_requested.is_set():
+                    break
+        else:
+            print("Error: Failed to capture frame from webcam.")
+    finally:
+        reader.stop()
+        if display is not None:
+            display.close()
+        if logger is not None:
+            logger.close()
+        if metrics is not None:
+            metrics.close()
 
 if __name__ == '__main__':
     args = parse_args()
-    cfg = mmcv.Config.fromfile(args.mot_config_path)
-    cfg.model.detector.init_cfg.checkpoint = args.detector_checkpoint
-    cfg.model.reid.init_cfg.checkpoint = args.reid_checkpoint
+    mot_config = model_source(args.artifact, args.mot_config_path, args.detector_checkpoint, args.reid_checkpoint)
 
-    display_from_cam(cfg, args.device, args.camera_id)
+    display_from_cam(mot_config, args.device, args.camera_id, args.headless, args.log_file, args.log_format, args.log_every,
+                     args.metrics_port, args.metrics_host, args.backend, args.backend_dir, parse_roi(args.roi, args.roi_polygon))
@@ -1,94 +1,81 @@
 import argparse
-import cv2
-import mmcv
-import os
-import tempfile
-import numpy as np
-from mmtrack.apis import inference_mot, init_model
+import time
+from counting import CrossingCounter, Line, parse_line, parse_zone, track_array
+from model_loader import add_model_args, load_mot_model, model_source
+from mot_inference import MOTRunner
+from roi import add_roi_args, parse_roi
+from video_stream import FrameReader, FrameWriter
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Process video frames using MOT model and track objects.')
-    parser.add_argument('--input-dir', required=True, help='Directory containing frames to process.')
-    parser.add_argument('--mot-config-path', required=True, help='Path to the MOT model configuration file.')
-    parser.add_argument('--detector-checkpoint', required=True, help='Path to the detector model checkpoint.')
-    parser.add_argument('--reid-checkpoint', required=True, help='Path to the re-identification model checkpoint.')
+    parser.add_argument('--input-dir', required=True, help='Directory containing frames or a video file to process.')
+    add_model_args(parser, '--mot-config-path')
     parser.add_argument('--output-video', required=True, help='Path where the output video will be saved.')
     parser.add_argument('--fps', type=int, default=30, help='Frames per second of the output video.')
     parser.add_argument('--device', default='cuda:0', help='Device to use for computation.')
+    parser.add_argument('--det-interval', type=int, default=1, help='Run the detector and ReID every K frames and use Kalman-predicted tracks in between.')
+    parser.add_argument('--batch-size', type=int, default=1, help='Number of frames the detector processes in one batch.')
+    parser.add_argument('--line', action='append', default=[], help='Counting line as x1,y1,x2,y2[,any|positive|negative]. Can be repeated; defaults to the horizontal middle line.')
+    parser.add_argument('--zone', action='append', default=[], help='Counting zone as polygon vertices x1,y1,x2,y2,x3,y3,... Can be repeated.')
+    add_roi_args(parser)
+    parser.add_argument('--queue-size', type=int, default=8, help='Maximum number of frames buffered between decode, tracking and encode.')
     return parser.parse_args()
 
-def process_frames(input_dir, mot_config, output_video, device='cuda:0', fps=30):
-    if os.path.isdir(input_dir):
-        frames = sorted([f for f in os.listdir(input_dir) if f.endswith('.jpg') or f.endswith('.png')])
-    elif os.path.isfile(input_dir) and input_dir.endswith(('.mp4', '.avi')):
-        # Extract frames from video
-        video = cv2.VideoCapture(input_dir)
-        frames = []
-        success, image = video.read()
-        temp_dir = tempfile.TemporaryDirectory()
-        frame_index = 1
-        while success:
-            frame_path = os.path.join(temp_dir.name, f"frame_{frame_index:06d}.jpg")
-            cv2.imwrite(frame_path, image)
-            frames.append(frame_path)
-            success, image = video.read()
-            frame_index += 1
-        video.release()
-    else:
-        raise ValueError("Input path must be a directory of images or a video file.")
+def process_frames(input_dir, mot_config, output_video, device='cuda:0', fps=30, queue_size=8, batch_size=1, regions=None, det_interval=1,
+                   backend='pytorch', backend_dir=None, roi=None):
+    # Frames are decoded on a reader thread and rendered frames are encoded on a
+    # writer thread, so no intermediate images touch the disk.
+    import mmcv
+    reader = FrameReader(input_dir, max_queue=queue_size)
+    writer = FrameWriter(output_video, fps=fps, fourcc='mp4v', max_queue=queue_size)
 
+    mot_model = load_mot_model(mot_config, device, backend=backend, backend_dir=backend_dir)
+    prog_bar = mmcv.ProgressBar(reader.num_frames)
 
-    num_frames = len(frames)
+    counter = CrossingCounter(regions) if regions else None
+    runner = MOTRunner(mot_model, batch_size=batch_size, det_interval=det_interval, roi=roi)
 
-    mot_model = init_model(mot_config, device=device)
-    prog_bar = mmcv.ProgressBar(num_frames)
-
-    out_dir = tempfile.TemporaryDirectory()
-    out_path = out_dir.name
-
-    count = 0
-    areas = []
-    tracked_ids = set()
-
-    for i, frame_file in enumerate(frames):
-        img_path = os.path.join(input_dir, frame_file)
-        img = cv2.imread(img_path)
-        height, width, _ = img.shape
-        mid_line_y = height // 2
-
-        result = inference_mot(mot_model, img, frame_id=i)
-        mot_model.show_result(
-            img,
-            result,
-            show=False,
-            wait_time=int(1000. / fps),
-            out_file=f'{out_path}/{i:06d}.jpg')
-
-        # Check for objects crossing the middle line
-        for bbox in result['track_bboxes'][0]:
-            if isinstance(bbox, np.ndarray) and bbox.ndim == 1 and len(bbox) >= 4:
-                track_id,xmin, ymin, bbox_width, bbox_height = bbox[:5]
-                xmax = xmin + bbox_width
-                ymax = ymin + bbox_height
-                if ymin <= mid_line_y <= ymax:
-                    if track_id not in tracked_ids:
-                      tracked_ids.add(track_id)
-                      count += 1
-                      bbox_area = bbox_width * bbox_height
-                      areas.append(bbox_area)
+    def handle(img, result):
+        nonlocal counter
+        if counter is None:
+            # Count objects whose box touches the middle line
+            mid_line_y = img.shape[0] // 2
+            counter = CrossingCounter([Line((0, mid_line_y), (img.shape[1], mid_line_y), trigger='touch', name='middle line')])
 
+        rendered = mot_model.show_result(img, result, show=False)
+        writer.write(roi.draw(rendered) if roi is not None else rendered)
+        counter.update(track_array(result))
         prog_bar.update()
-    print(f'\nTotal objects crossed the line: {count}')
 
     print(f'\nMaking the output video at {output_video} with a FPS of {fps}')
-    mmcv.frames2video(out_path, output_video, fps=fps, fourcc='mp4v')
-    out_dir.cleanup()
-    return f'\nTotal objects crossed the line: {count}'
+    num_frames = 0
+    start_time = time.time()
+    try:
+        for i, img in reader:
+            for _, frame, result in runner.push(i, img):
+                handle(frame, result)
+            num_frames += 1
+        for _, frame, result in runner.flush():
+            handle(frame, result)
+    finally:
+        reader.stop()
+        writer.close()
+    elapsed_time = time.time() - start_time
+    print(f'\nProcessed {num_frames} frames in {elapsed_time:.1f}s '
+          f'({num_frames / max(elapsed_time, 1e-6):.2f} FPS, batch size {batch_size})')
+    if hasattr(mot_model.tracker, 'reid_summary'):
+        print(f'\n{mot_model.tracker.reid_summary()}')
+    counts = counter.counts if counter is not None else {}
+    for name, count in counts.items():
+        print(f'\nObjects crossed {name}: {count}')
+    total = sum(counts.values())
+    print(f'\nTotal objects crossed the line: {total}')
+    return f'\nTotal objects crossed the line: {total}'
 
 if __name__ == '__main__':
     args = parse_args()
-    cfg = mmcv.Config.fromfile(args.mot_config_path)
-    cfg.model.detector.init_cfg.checkpoint = args.detector_checkpoint
-    cfg.model.reid.init_cfg.checkpoint = args.reid_checkpoint
+    mot_config = model_source(args.artifact, args.mot_config_path, args.detector_checkpoint, args.reid_checkpoint)
 
-    print(process_frames(args.input_dir, cfg, args.output_video, args.device, args.fps))
\ No newline at end of file
+    print(process_frames(args.input_dir, mot_config, args.output_video, args.device, args.fps, args.queue_size, args.batch_size,
+                         [parse_line(spec) for spec in args.line] + [parse_zone(spec) for spec in args.zone], args.det_interval,
+                         args.backend, args.backend_dir, parse_roi(args.roi, args.roi_polygon)))
\ No newline at end of file
@@ -0,0 +1,96 @@
+import argparse
+import copy
+import os
+import numpy as np
+import mmcv
+import torch
+from torch import nn
+from mmcv.runner import load_checkpoint
+from mmtrack.datasets import build_dataset
+from mmtrack.models import build_reid
+from inference_backend import ReIDEmbedding, backend_paths
+
+QUANTIZATION_MODES = ('none', 'dynamic', 'static')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Quantize a trained ReID model to INT8 and export it for the torchscript backend.')
+    parser.add_argument('--config', required=True, help='ReID config file, e.g. models/resnet50_b32x8_MOT17.py.')
+    parser.add_argument('--checkpoint', required=True, help='ReID checkpoint trained with that config.')
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES[1:], default='static', help='dynamic: INT8 Linear layers; static: INT8 backbone calibrated on training crops.')
+    parser.add_argument('--backend-dir', required=True, help='Directory the TorchScript reid.pt is written to (use with --backend torchscript).')
+    parser.add_argument('--calib-batches', type=int, default=10, help='Number of batches of training crops used to calibrate static quantization.')
+    parser.add_argument('--batch-size', type=int, default=32, help='Crops per calibration batch.')
+    parser.add_argument('--qengine', choices=('fbgemm', 'qnnpack'), default='fbgemm', help='Quantized kernel library: fbgemm for x86, qnnpack for ARM.')
+    return parser.parse_args()
+
+def load_reid(config, checkpoint):
+    cfg = mmcv.Config.fromfile(config) if isinstance(config, str) else config
+    reid = build_reid(cfg.model.reid)
+    load_checkpoint(reid, checkpoint, map_location='cpu')
+    return cfg, reid.eval()
+
+def crop_size(cfg):
+    # (height, width) of the ReID input; mmcv img_scale is (width, height)
+    for transform in cfg.data.test.pipeline:
+        if transform.type == 'Resize':
+            width, height = transform.img_scale
+            return height, width
+    return 256, 128
+
+def build_crop_dataset(cfg, split='test'):
+    # Any split run through the ReID test pipeline: resized, normalized crops
+    # without augmentation or triplet sampling.
+    data_cfg = copy.deepcopy(cfg.data[split])
+    data_cfg.pipeline = cfg.data.test.pipeline
+    data_cfg.triplet_sampler = None
+    return build_dataset(data_cfg)
+
+def iter_batches(dataset, batch_size, indices=None):
+    indices = range(len(dataset)) if indices is None else indices
+    for start in range(0, len(indices), batch_size):
+        yield torch.stack([dataset[i]['img'] for i in indices[start:start + batch_size]])
+
+def calibration_batches(dataset, num_batches, batch_size, seed=0):
+    # random crops, so calibration is not limited to the first few identities
+    indices = np.random.RandomState(seed).permutation(len(dataset))[:num_batches * batch_size]
+    return list(iter_batches(dataset, batch_size, indices.tolist()))
+
+def quantize_dynamic(reid):
+    # INT8 weights for the fc layers of the head; activations stay float
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(reid).cpu().eval(), {nn.Linear}, dtype=torch.qint8)
+
+def quantize_static(reid, batches, qengine='fbgemm'):
+    # FX graph mode post-training quantization of the backbone; the neck and the
+    # head run in float on the dequantized features.
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+    torch.backends.quantized.engine = qengine
+    reid = copy.deepcopy(reid).cpu().eval()
+    prepared = prepare_fx(reid.backbone, get_default_qconfig_mapping(qengine), example_inputs=(batches[0], ))
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    reid.backbone = convert_fx(prepared)
+    return reid
+
+def quantize(reid, mode, cfg=None, calib_batches=10, batch_size=32, qengine='fbgemm'):
+    if mode == 'none':
+        return reid
+    if mode == 'dynamic':
+        return quantize_dynamic(reid)
+    dataset = build_crop_dataset(cfg, 'train')
+    return quantize_static(reid, calibration_batches(dataset, calib_batches, batch_size), qengine)
+
+def export_reid(reid, path, input_size=(256, 128)):
+    with torch.no_grad():
+        torch.jit.save(torch.jit.trace(ReIDEmbedding(reid), torch.randn(2, 3, *input_size)), path)
+    return path
+
+if __name__ == '__main__':
+    args = parse_args()
+    cfg, reid = load_reid(args.config, args.checkpoint)
+    quantized = quantize(reid, args.mode, cfg, args.calib_batches, args.batch_size, args.qengine)
+
+    os.makedirs(args.backend_dir, exist_ok=True)
+    _, reid_path = backend_paths(args.backend_dir, 'torchscript')
+    print(f'{args.mode} INT8 ReID written to {export_reid(quantized, reid_path, crop_size(cfg))}')
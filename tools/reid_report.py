@@ -0,0 +1,86 @@
+import argparse
+import io
+import json
+import time
+import numpy as np
+import torch
+from quantize_reid import QUANTIZATION_MODES, build_crop_dataset, crop_size, iter_batches, load_reid, quantize
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare ReID variants (backbone depth, INT8 quantization) on accuracy and CPU latency.')
+    parser.add_argument('--variant', action='append', required=True, metavar='NAME,CONFIG,CHECKPOINT[,MODE]',
+                        help=f'A ReID variant; MODE is one of {QUANTIZATION_MODES} (default none). Repeat for each variant.')
+    parser.add_argument('--batch-size', type=int, default=32, help='Crops per batch for evaluation and the batched latency.')
+    parser.add_argument('--latency-crops', type=int, default=200, help='Number of single-crop forwards timed per variant.')
+    parser.add_argument('--calib-batches', type=int, default=10, help='Calibration batches for static quantization.')
+    parser.add_argument('--threads', type=int, help='torch CPU threads, e.g. the core count of the line PC.')
+    parser.add_argument('--out', help='Optional JSON file for the report.')
+    return parser.parse_args()
+
+def parse_variant(spec):
+    parts = spec.split(',')
+    if len(parts) not in (3, 4) or (len(parts) == 4 and parts[3] not in QUANTIZATION_MODES):
+        raise ValueError(f'Invalid --variant {spec!r}; expected NAME,CONFIG,CHECKPOINT[,{"|".join(QUANTIZATION_MODES)}]')
+    return dict(name=parts[0], config=parts[1], checkpoint=parts[2], mode=parts[3] if len(parts) == 4 else 'none')
+
+def model_size_mb(reid):
+    buffer = io.BytesIO()
+    torch.save(reid.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+def evaluate(reid, dataset, batch_size):
+    # mAP / CMC on the ReID test split, as in train.py's evaluation
+    with torch.no_grad():
+        feats = torch.cat([reid.simple_test(batch) for batch in iter_batches(dataset, batch_size)])
+    results = dataset.evaluate(list(feats), metric='mAP')
+    return {key: float(value) for key, value in results.items()}
+
+def measure_latency(reid, input_size, num_crops, batch_size, warmup=10):
+    single = torch.rand(1, 3, *input_size)
+    batch = torch.rand(batch_size, 3, *input_size)
+    times = []
+    with torch.no_grad():
+        for _ in range(warmup):
+            reid.simple_test(single)
+        for _ in range(num_crops):
+            start = time.perf_counter()
+            reid.simple_test(single)
+            times.append(time.perf_counter() - start)
+        reid.simple_test(batch)
+        num_batches = max(1, num_crops // batch_size)
+        start = time.perf_counter()
+        for _ in range(num_batches):
+            reid.simple_test(batch)
+        batched = (time.perf_counter() - start) / (num_batches * batch_size)
+    return dict(crop_p50_ms=float(np.percentile(times, 50)) * 1000, crop_p90_ms=float(np.percentile(times, 90)) * 1000,
+                batched_ms_per_crop=batched * 1000)
+
+def evaluate_variant(variant, batch_size=32, latency_crops=200, calib_batches=10):
+    cfg, reid = load_reid(variant['config'], variant['checkpoint'])
+    reid = quantize(reid.cpu(), variant['mode'], cfg, calib_batches, batch_size)
+    row = dict(variant)
+    row.update(evaluate(reid, build_crop_dataset(cfg, 'test'), batch_size))
+    row.update(measure_latency(reid, crop_size(cfg), latency_crops, batch_size))
+    row['size_mb'] = model_size_mb(reid)
+    return row
+
+def print_report(rows):
+    header = f'{"variant":<20}{"mode":<9}{"mAP":>7}{"R1":>7}{"crop p50":>10}{"crop p90":>10}{"ms/crop@bs":>12}{"size MB":>9}'
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f'{row["name"]:<20}{row["mode"]:<9}{row["mAP"]:>7.3f}{row["R1"]:>7.3f}{row["crop_p50_ms"]:>10.2f}'
+              f'{row["crop_p90_ms"]:>10.2f}{row["batched_ms_per_crop"]:>12.2f}{row["size_mb"]:>9.1f}')
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    variants = [parse_variant(spec) for spec in args.variant]
+    rows = [evaluate_variant(variant, args.batch_size, args.latency_crops, args.calib_batches) for variant in variants]
+    print_report(rows)
+    # mAP/R1 rank crops; confirm the chosen variant's IDF1 on full tracking with test.py
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(dict(threads=torch.get_num_threads(), batch_size=args.batch_size, variants=rows), f, indent=2)
+        print(f'Report written to {args.out}')
@@ -0,0 +1,59 @@
+import os.path as osp
+import numpy as np
+from mmdet.datasets.builder import PIPELINES
+
+# ReID crops written by generateToReid.py --shards: uint8 arrays of shape
+# (n, height, width, 3) in <data_prefix>/shard_XXX.npy. The meta lists name
+# crops as '<shard>:<row> <label>' instead of '<identity>/<image>.jpg <label>'.
+
+
+def parse_entry(filename):
+    shard, row = filename.rsplit(':', 1)
+    return shard, int(row)
+
+
+# Memory-mapped shards of one directory, opened on first use.
+class ReIDShards:
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        self._shards = {}
+
+    def get(self, filename):
+        shard, row = parse_entry(filename)
+        if shard not in self._shards:
+            self._shards[shard] = np.load(osp.join(self.shard_dir, shard), mmap_mode='r')
+        return self._shards[shard][row]
+
+
+# Drop-in for LoadImageFromFile on a ReIDDataset whose data_prefix is a shard
+# directory. The shards are opened lazily in each dataloader worker.
+@PIPELINES.register_module()
+class LoadImageFromShards:
+    def __init__(self, to_float32=False):
+        self.to_float32 = to_float32
+        self._shards = {}
+
+    def __call__(self, results):
+        shard_dir = results['img_prefix']
+        if shard_dir not in self._shards:
+            self._shards[shard_dir] = ReIDShards(shard_dir)
+        filename = results['img_info']['filename']
+        img = self._shards[shard_dir].get(filename)
+        img = img.astype(np.float32) if self.to_float32 else img.copy()
+        results['filename'] = osp.join(shard_dir, filename)
+        results['ori_filename'] = filename
+        results['img'] = img
+        results['img_shape'] = img.shape
+        results['ori_shape'] = img.shape
+        results['img_fields'] = ['img']
+        return results
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(to_float32={self.to_float32})'
+
+
+# Drop-in for LoadMultiImagesFromFile (the triplet-sampled crops).
+@PIPELINES.register_module()
+class LoadMultiImagesFromShards(LoadImageFromShards):
+    def __call__(self, results):
+        return [super(LoadMultiImagesFromShards, self).__call__(_results) for _results in results]
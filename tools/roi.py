@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+
+# A fixed region of interest of the camera frame, given as a rectangle
+# (x1, y1, x2, y2), a polygon, or both. Frames are cropped to the rectangle
+# (the polygon's bounding box when only a polygon is given) before
+# preprocessing, pixels outside the polygon are blanked, and result boxes are
+# shifted back to full-frame coordinates. fit() makes the test resize scale the
+# crop like the full frame, so the detector sees the same pixels inside the ROI
+# and its cost drops with the area removed.
+class RegionOfInterest:
+    def __init__(self, rect=None, polygon=None):
+        if rect is None and polygon is None:
+            raise ValueError('A region of interest needs a rectangle or a polygon.')
+        self.polygon = None if polygon is None else np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        if self.polygon is not None and len(self.polygon) < 3:
+            raise ValueError('A region of interest polygon needs at least three vertices.')
+        if rect is None:
+            rect = (*self.polygon.min(axis=0), *self.polygon.max(axis=0))
+        x1, y1, x2, y2 = (int(round(v)) for v in rect)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f'Invalid region of interest rectangle {rect}.')
+        self.rect = (x1, y1, x2, y2)
+        self._mask = None
+        self._frame_shape = None
+        self._full_frame_scales = None
+
+    def bounds(self, frame_shape):
+        # the rectangle clipped to the frame
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = self.rect
+        x1, y1 = min(max(x1, 0), width - 1), min(max(y1, 0), height - 1)
+        return x1, y1, max(min(x2, width), x1 + 1), max(min(y2, height), y1 + 1)
+
+    @property
+    def offset(self):
+        if self._frame_shape is None:
+            raise RuntimeError('The region of interest has not seen a frame yet.')
+        return self.bounds(self._frame_shape)[:2]
+
+    def crop(self, frame):
+        if self._frame_shape != frame.shape[:2]:
+            self._frame_shape = frame.shape[:2]
+            self._mask = self._make_mask()
+        x1, y1, x2, y2 = self.bounds(frame.shape)
+        crop = frame[y1:y2, x1:x2]
+        if self._mask is None:
+            return np.ascontiguousarray(crop)
+        return cv2.bitwise_and(crop, crop, mask=self._mask)
+
+    def _make_mask(self):
+        if self.polygon is None:
+            return None
+        x1, y1, x2, y2 = self.bounds(self._frame_shape)
+        mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.round(self.polygon - (x1, y1)).astype(np.int32)], 255)
+        return mask
+
+    def fit(self, cfg, frame_shape):
+        # Replaces the img_scale of the keep-ratio test resize with one that
+        # gives the crop the scale factor mmcv.rescale_size would give the full
+        # frame. Modifies cfg in place; the full-frame img_scale is remembered,
+        # so fitting again (e.g. for another frame size) starts from it.
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = self.bounds(frame_shape)
+        transforms = [transform for transform in cfg.data.test.pipeline if transform.get('img_scale') is not None]
+        if self._full_frame_scales is None:
+            self._full_frame_scales = [tuple(transform.img_scale) for transform in transforms]
+        for transform, img_scale in zip(transforms, self._full_frame_scales):
+            long_edge, short_edge = max(img_scale), min(img_scale)
+            scale_factor = min(long_edge / max(height, width), short_edge / min(height, width))
+            transform.img_scale = (int(np.ceil((x2 - x1) * scale_factor)), int(np.ceil((y2 - y1) * scale_factor)))
+        return cfg
+
+    def to_frame(self, result):
+        # Shifts det_bboxes ([x1, y1, x2, y2, score]) and track_bboxes
+        # ([id, x1, y1, x2, y2, score]) of one frame's result from crop to
+        # full-frame coordinates; returns a new result dict.
+        dx, dy = self.offset
+        shift = np.array([dx, dy, dx, dy], dtype=np.float32)
+        shifted = dict(result)
+        for key, start in (('det_bboxes', 0), ('track_bboxes', 1)):
+            class_bboxes = []
+            for bboxes in result[key]:
+                bboxes = bboxes.copy()
+                bboxes[:, start:start + 4] += shift
+                class_bboxes.append(bboxes)
+            shifted[key] = class_bboxes
+        return shifted
+
+    def draw(self, frame, color=(0, 255, 255), thickness=2):
+        if self.polygon is not None:
+            cv2.polylines(frame, [np.round(self.polygon).astype(np.int32)], True, color, thickness)
+        else:
+            x1, y1, x2, y2 = self.bounds(frame.shape)
+            cv2.rectangle(frame, (x1, y1), (x2 - 1, y2 - 1), color, thickness)
+        return frame
+
+
+def add_roi_args(parser):
+    parser.add_argument('--roi', help='Region of interest rectangle x1,y1,x2,y2; only this part of the frame is processed.')
+    parser.add_argument('--roi-polygon', help='Region of interest polygon x1,y1,x2,y2,x3,y3,...; pixels outside it are ignored.')
+
+
+def parse_roi(rect_spec=None, polygon_spec=None):
+    # "x1,y1,x2,y2" and/or "x1,y1,x2,y2,x3,y3,..."; None when neither is given
+    if not rect_spec and not polygon_spec:
+        return None
+    rect = polygon = None
+    if rect_spec:
+        rect = [float(p) for p in rect_spec.split(',')]
+        if len(rect) != 4:
+            raise ValueError(f'Invalid region of interest {rect_spec!r}, expected x1,y1,x2,y2.')
+    if polygon_spec:
+        polygon = [float(p) for p in polygon_spec.split(',')]
+        if len(polygon) % 2:
+            raise ValueError(f'Invalid region of interest polygon {polygon_spec!r}, expected pairs of x,y coordinates.')
+    return RegionOfInterest(rect, polygon)
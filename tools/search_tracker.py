@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import copy
+import csv
+import io
+import itertools
+import multiprocessing
+import os
+import os.path as osp
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import torch
+from mmtrack.datasets import build_dataset
+from det_cache import DetectionCache, build_det_cache, build_replay_tracker, cache_path, replay_tracking
+from test import build_test_loader, build_test_model, evaluate_outputs, load_test_config
+
+RANGE_KINDS = ('uniform', 'int')
+# counts and distances under the names of both mmtrack evaluation backends
+# (motmetrics and TrackEval); everything else ranks higher-is-better
+LOWER_IS_BETTER = ('FP', 'FN', 'IDs', 'IDSw', 'IDSW', 'FM', 'Frag', 'ML', 'MOTP')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Search tracker settings on cached detections and embeddings.')
+    parser.add_argument('--config', help='Test config file path', required=True)
+    parser.add_argument('--detector-checkpoint', help='Path to the detector checkpoint', required=True)
+    parser.add_argument('--reid-checkpoint', help='Path to the re-identification checkpoint', required=True)
+    parser.add_argument('--work-dir', help='The dir to save the trials and the best config', required=True)
+    parser.add_argument('--det-cache', required=True, help='Detection cache directory of tools/test.py --det-cache; built if missing')
+    parser.add_argument('--device', default='cuda:0', help='Device used when the detection cache has to be built.')
+    parser.add_argument('--param', action='append', required=True, metavar='NAME=SPACE',
+                        help='A tracker setting and its values, e.g. obj_score_thr=0.3,0.4,0.5, reid.match_score_thr=uniform:1:3 '
+                             'or num_frames_retain=int:20:200. Can be repeated.')
+    parser.add_argument('--trials', type=int, help='Number of random trials. Without it the full grid is searched (value lists only).')
+    parser.add_argument('--metric', default='IDF1', help='Metric the trials are ranked on.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes evaluating trials.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random search.')
+    return parser.parse_args()
+
+def parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return {'True': True, 'False': False, 'None': None}.get(text, text)
+
+def parse_param(spec):
+    # "name=v1,v2,..." or "name=uniform:low:high" / "name=int:low:high"
+    name, _, space = spec.partition('=')
+    if not name or not space:
+        raise ValueError(f'Invalid --param {spec!r}, expected NAME=SPACE.')
+    kind = space.split(':', 1)[0]
+    if kind in RANGE_KINDS:
+        _, low, high = space.split(':')
+        return name, (kind, float(low), float(high))
+    return name, [parse_value(value) for value in space.split(',')]
+
+def grid_trials(space):
+    if any(isinstance(values, tuple) for values in space.values()):
+        raise ValueError('Ranges need a random search; pass --trials.')
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+def random_trials(space, num_trials, seed=0):
+    rng = random.Random(seed)
+    trials, seen = [], set()
+    for _ in range(num_trials * 20):
+        if len(trials) == num_trials:
+            break
+        trial = {}
+        for name, values in space.items():
+            if isinstance(values, list):
+                trial[name] = rng.choice(values)
+            elif values[0] == 'int':
+                trial[name] = rng.randint(int(values[1]), int(values[2]))
+            else:
+                trial[name] = round(rng.uniform(values[1], values[2]), 4)
+        key = tuple(trial.values())
+        if key not in seen:
+            seen.add(key)
+            trials.append(trial)
+    return trials
+
+def set_params(tracker_cfg, params):
+    # dotted names address nested keys, e.g. reid.match_score_thr
+    for name, value in params.items():
+        node = tracker_cfg
+        *parents, key = name.split('.')
+        for parent in parents:
+            node = node[parent]
+        node[key] = value
+    return tracker_cfg
+
+# Per-process state, loaded once by init_worker.
+_worker = {}
+
+def init_worker(config, detector_checkpoint, reid_checkpoint, work_dir, cache_dir):
+    torch.set_num_threads(1)
+    cfg = load_test_config(config, detector_checkpoint, reid_checkpoint, work_dir)
+    _worker.update(cfg=cfg, dataset=build_dataset(cfg.data.test), cache=DetectionCache(cache_dir))
+
+def run_trial(params, metrics):
+    cfg, dataset = _worker['cfg'], _worker['dataset']
+    tracker = build_replay_tracker(set_params(copy.deepcopy(cfg.model.tracker), params))
+    outputs = replay_tracking(cfg, _worker['cache'], dataset.data_infos, tracker)
+    # dataset.evaluate prints its tables; keep the search output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = evaluate_outputs(cfg, dataset, outputs)
+    return params, {name: results.get(name) for name in metrics}, sorted(results)
+
+def format_value(value):
+    if isinstance(value, dict):
+        return 'dict(' + ', '.join(f'{key}={format_value(item)}' for key, item in value.items()) + ')'
+    return repr(value)
+
+def write_best_config(path, base_config, params, summary):
+    overrides = {}
+    for name, value in params.items():
+        node = overrides
+        *parents, key = name.split('.')
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = value
+    with open(path, 'w') as f:
+        f.write(f'_base_ = [{osp.abspath(base_config)!r}]\n')
+        f.write(f'# tools/search_tracker.py: {summary}\n')
+        f.write(f'model = dict(tracker={format_value(overrides)})\n')
+    return path
+
+def main():
+    args = parse_args()
+    space = dict(parse_param(spec) for spec in args.param)
+    trials = random_trials(space, args.trials, args.seed) if args.trials else grid_trials(space)
+    cfg = load_test_config(args.config, args.detector_checkpoint, args.reid_checkpoint, args.work_dir)
+    os.makedirs(args.work_dir, exist_ok=True)
+    metrics = list(dict.fromkeys([args.metric, 'HOTA'] + list(cfg.get('search_metrics', []))))
+
+    cache_dir = cache_path(args.det_cache, cfg, args.detector_checkpoint, args.reid_checkpoint)
+    if not DetectionCache.exists(cache_dir):
+        print(f'Building the detection cache in {cache_dir}')
+        _, data_loader = build_test_loader(cfg)
+        build_det_cache(build_test_model(cfg, args.device), data_loader, cache_dir)
+
+    csv_path = osp.join(args.work_dir, 'trials.csv')
+    rows = []
+    start_time = time.perf_counter()
+    with open(csv_path, 'w', newline='') as f, ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker,
+            initargs=(args.config, args.detector_checkpoint, args.reid_checkpoint, args.work_dir, cache_dir)) as pool:
+        writer = csv.DictWriter(f, fieldnames=['trial'] + list(space) + metrics)
+        writer.writeheader()
+        futures = {pool.submit(run_trial, params, metrics): i for i, params in enumerate(trials)}
+        for done, future in enumerate(as_completed(futures), 1):
+            params, results, available = future.result()
+            if args.metric not in available:
+                for pending in futures:
+                    pending.cancel()
+                raise ValueError(f'dataset.evaluate does not report --metric {args.metric}; available metrics: {available}')
+            row = dict(trial=futures[future], **params, **results)
+            rows.append(row)
+            writer.writerow(row)
+            f.flush()
+            print(f'[{done}/{len(trials)}] {params} {args.metric}={results[args.metric]}')
+
+    scored = [row for row in rows if row[args.metric] is not None]
+    if not scored:
+        raise ValueError(f'No trial reported {args.metric}; available metrics: {metrics}')
+    scored.sort(key=lambda row: row[args.metric], reverse=args.metric not in LOWER_IS_BETTER)
+    best = scored[0]
+    best_params = {name: best[name] for name in space}
+    summary = f"{args.metric}={best[args.metric]} over {len(rows)} trials"
+    best_path = write_best_config(osp.join(args.work_dir, 'best_tracker.py'), args.config, best_params, summary)
+
+    elapsed = time.perf_counter() - start_time
+    print(f'\n{len(rows)} trials in {elapsed:.1f}s ({elapsed / max(len(rows), 1):.2f}s per trial, {args.workers} workers)')
+    print(f'Top trials by {args.metric}:')
+    for row in scored[:5]:
+        print('  ' + ', '.join(f'{key}={row[key]}' for key in list(space) + metrics))
+    print(f'Trials written to {csv_path}, best config to {best_path}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import numpy as np
+
+from counting import TRACK_ID, X1, X2, Y1, Y2
+
+UNDEFINED = 'Undefined'
+# How a track box's diagonal is measured: 'corner' is the legacy value the
+# size.json ranges were calibrated on (the x2/y2 corner read as width/height,
+# i.e. its distance from the image origin), 'box' the true box diagonal.
+DIAGONAL_MODES = ('corner', 'box')
+
+
+# Bins box diagonals into the size ranges of size.json and fixes one label per
+# track by majority vote. Bins are half-open (lower <= d < next lower), so
+# diagonals between two ranges' bounds are not lost; only the last range's
+# upper bound is used. A track's label is committed after `vote_frames`
+# observations, or once it has not been seen for `max_age` frames, so partial
+# first views at the edge of the frame do not decide the label on their own.
+class SizeClassifier:
+    def __init__(self, size_ranges, vote_frames=10, max_age=30, diagonal='corner'):
+        if diagonal not in DIAGONAL_MODES:
+            raise ValueError(f'Invalid diagonal mode {diagonal!r}, expected one of {DIAGONAL_MODES}.')
+        self.diagonal = diagonal
+        labels = [label for label in size_ranges if label != UNDEFINED]
+        bounds = np.array([size_ranges[label] for label in labels], dtype=np.float64).reshape(-1, 2)
+        order = np.argsort(bounds[:, 0], kind='stable')
+        self.labels = [labels[i] for i in order] + [UNDEFINED]
+        self._lower = bounds[order, 0]
+        self._upper = bounds[order[-1], 1] if len(order) else 0.0
+        self.undefined = len(self.labels) - 1
+        self.vote_frames = max(int(vote_frames), 1)
+        self.max_age = max_age
+
+        self.counts = {label: 0 for label in size_ranges}
+        self.counts.setdefault(UNDEFINED, 0)
+
+        self._votes = np.zeros((256, len(self.labels)), dtype=np.int32)
+        self._last_seen = np.full(256, -1, dtype=np.int64)
+        self._committed = np.full(256, -1, dtype=np.int32)
+
+    def classify(self, diagonals):
+        diagonals = np.asarray(diagonals, dtype=np.float64)
+        if len(self._lower) == 0:
+            return np.full(diagonals.shape, self.undefined, dtype=np.int64)
+        bins = np.searchsorted(self._lower, diagonals, side='right') - 1
+        valid = (bins >= 0) & ((bins < len(self._lower) - 1) | (diagonals <= self._upper))
+        return np.where(valid, bins, self.undefined)
+
+    def diagonals(self, tracks):
+        if self.diagonal == 'corner':
+            return np.hypot(tracks[:, X2], tracks[:, Y2])
+        return np.hypot(tracks[:, X2] - tracks[:, X1], tracks[:, Y2] - tracks[:, Y1])
+
+    def _reserve(self, size):
+        if size <= len(self._last_seen):
+            return
+        size = max(size, 2 * len(self._last_seen))
+        votes = np.zeros((size, len(self.labels)), dtype=np.int32)
+        votes[:len(self._votes)] = self._votes
+        last_seen = np.full(size, -1, dtype=np.int64)
+        last_seen[:len(self._last_seen)] = self._last_seen
+        committed = np.full(size, -1, dtype=np.int32)
+        committed[:len(self._committed)] = self._committed
+        self._votes, self._last_seen, self._committed = votes, last_seen, committed
+
+    def _commit(self, ids):
+        if len(ids) == 0:
+            return
+        winners = self._votes[ids].argmax(axis=1)
+        self._committed[ids] = winners
+        for label_index, count in enumerate(np.bincount(winners, minlength=len(self.labels))):
+            if count:
+                self.counts[self.labels[label_index]] += int(count)
+
+    def update(self, frame_id, tracks):
+        # Returns the label index of every row: committed if decided, else the current vote leader.
+        tracks = np.asarray(tracks)
+        if len(tracks) == 0:
+            self._expire(frame_id)
+            return np.zeros(0, dtype=np.int64)
+        ids = tracks[:, TRACK_ID].astype(np.int64)
+        classes = self.classify(self.diagonals(tracks))
+
+        self._reserve(int(ids.max()) + 1)
+        pending = self._committed[ids] < 0
+        np.add.at(self._votes, (ids[pending], classes[pending]), 1)
+        self._last_seen[ids] = frame_id
+
+        ready = pending & (self._votes[ids].sum(axis=1) >= self.vote_frames)
+        self._commit(np.unique(ids[ready]))
+        self._expire(frame_id)
+
+        committed = self._committed[ids]
+        return np.where(committed >= 0, committed, self._votes[ids].argmax(axis=1))
+
+    def _expire(self, frame_id):
+        if self.max_age is None:
+            return
+        gone = (self._last_seen >= 0) & (self._committed < 0) & (frame_id - self._last_seen > self.max_age)
+        self._commit(np.nonzero(gone)[0])
+
+    def flush(self):
+        # Commit every track still voting, e.g. at the end of a video.
+        self._commit(np.nonzero((self._last_seen >= 0) & (self._committed < 0))[0])
+        return self.counts
@@ -0,0 +1,74 @@
+import functools
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+# Wall-clock time per named pipeline stage, aggregated per frame. Stages may
+# nest (e.g. ReID inside the tracker); time spent in an inner stage is only
+# counted for the inner one, so the stages of a frame add up to its total.
+# `sync` is called around every stage, e.g. torch.cuda.synchronize on GPU.
+class StageTimer:
+    def __init__(self, sync=None):
+        self.sync = sync
+        self.samples = {}
+        self.num_frames = 0
+        self._current = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        if self.sync is not None:
+            self.sync()
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync is not None:
+                self.sync()
+            elapsed = time.perf_counter() - start
+            inner = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self._current[name] = self._current.get(name, 0.0) + elapsed - inner
+
+    def wrap(self, obj, attr, name):
+        # Times every call of obj.attr as stage `name`; returns the original.
+        method = getattr(obj, attr)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return method(*args, **kwargs)
+
+        setattr(obj, attr, timed)
+        return method
+
+    def end_frame(self):
+        # stages that did not run in this frame (e.g. ReID without detections) cost 0
+        frame = dict(self._current, frame=sum(self._current.values()))
+        for name in frame:
+            self.samples.setdefault(name, [0.0] * self.num_frames)
+        for name, values in self.samples.items():
+            values.append(frame.get(name, 0.0))
+        self.num_frames += 1
+        self._current = {}
+
+    def reset(self):
+        self.samples = {}
+        self.num_frames = 0
+        self._current = {}
+
+    def summary(self):
+        summary = {}
+        for name, values in self.samples.items():
+            values_ms = np.asarray(values) * 1000
+            stats = dict(count=len(values_ms), mean_ms=round(float(values_ms.mean()), 3))
+            for q, value in zip(PERCENTILES, np.percentile(values_ms, PERCENTILES)):
+                stats[f'p{q}_ms'] = round(float(value), 3)
+            summary[name] = stats
+        return summary
@@ -0,0 +1,119 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import os.path as osp
+import torch
+from test import build_test_loader, build_test_model, evaluate_outputs, load_test_config, run_test
+
+# Test-time settings that trade accuracy for speed: (column, help)
+SETTINGS = [
+    ('img_scale', 'Square test img_scale of the keep-ratio resize, e.g. 640 800 1088.'),
+    ('rpn_nms_pre', 'RPN proposals kept per level before NMS (test_cfg.rpn.nms_pre).'),
+    ('rpn_max_per_img', 'RPN proposals kept after NMS (test_cfg.rpn.max_per_img).'),
+    ('rcnn_max_per_img', 'Detections kept per frame (test_cfg.rcnn.max_per_img).'),
+    ('reid_num_samples', 'Stored embeddings per track used for ReID matching (tracker.reid.num_samples).'),
+]
+REPORTED_METRICS = ['HOTA', 'MOTA', 'IDF1']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Evaluate a grid of test-time settings and report the speed/accuracy Pareto front.')
+    parser.add_argument('--config', help='Test config file path', required=True)
+    parser.add_argument('--detector-checkpoint', help='Path to the detector checkpoint', required=True)
+    parser.add_argument('--reid-checkpoint', help='Path to the re-identification checkpoint', required=True)
+    parser.add_argument('--work-dir', help='The dir to save logs and results', required=True)
+    parser.add_argument('--device', default='cuda:0', help='Device to use for computation.')
+    parser.add_argument('--warmup-batches', type=int, default=10, help='Untimed batches run before the trials of each img_scale.')
+    for name, help_text in SETTINGS:
+        parser.add_argument('--' + name.replace('_', '-'), type=int, nargs='+', help=help_text + ' Defaults to the config value.')
+    parser.add_argument('--metric', default='IDF1', help='Accuracy metric of the Pareto front.')
+    return parser.parse_args()
+
+def config_settings(cfg):
+    test_scale = next(transform.img_scale for transform in cfg.data.test.pipeline if transform.get('img_scale') is not None)
+    test_cfg = cfg.model.detector.test_cfg
+    return dict(
+        img_scale=max(test_scale),
+        rpn_nms_pre=test_cfg.rpn.nms_pre,
+        rpn_max_per_img=test_cfg.rpn.max_per_img,
+        rcnn_max_per_img=test_cfg.rcnn.max_per_img,
+        reid_num_samples=cfg.model.tracker.reid.num_samples)
+
+def set_img_scale(cfg, img_scale):
+    for transform in cfg.data.test.pipeline:
+        if transform.get('img_scale') is not None:
+            transform.img_scale = (img_scale, img_scale)
+
+def apply_settings(model, settings):
+    # The detector heads and the tracker keep references to their test_cfg /
+    # reid dicts, so the built model is updated in place between trials.
+    detector = model.module.detector
+    detector.rpn_head.test_cfg.nms_pre = settings['rpn_nms_pre']
+    detector.rpn_head.test_cfg.max_per_img = settings['rpn_max_per_img']
+    detector.roi_head.test_cfg.max_per_img = settings['rcnn_max_per_img']
+    model.module.tracker.reid['num_samples'] = settings['reid_num_samples']
+
+def warm_up(model, data_loader, num_batches):
+    # An untimed partial pass, so the first trial does not pay for CUDA/cuDNN
+    # setup, first allocations and cold file reads that later trials skip.
+    model.eval()
+    with torch.no_grad():
+        for _, data in zip(range(num_batches), data_loader):
+            model(return_loss=False, rescale=True, **data)
+    model.module.tracker.reset()
+
+def pareto_front(rows, metric):
+    # rows not beaten by another row on both FPS and the metric
+    front = []
+    for row in rows:
+        dominated = any(other['fps'] >= row['fps'] and other[metric] >= row[metric]
+                        and (other['fps'] > row['fps'] or other[metric] > row[metric]) for other in rows)
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda row: row['fps'])
+
+def main():
+    args = parse_args()
+    cfg = load_test_config(args.config, args.detector_checkpoint, args.reid_checkpoint, args.work_dir)
+    os.makedirs(args.work_dir, exist_ok=True)
+    defaults = config_settings(cfg)
+    grid = {name: getattr(args, name) or [defaults[name]] for name, _ in SETTINGS}
+    metrics = list(dict.fromkeys(REPORTED_METRICS + [args.metric] + list(cfg.get('search_metrics', []))))
+
+    model = build_test_model(cfg, args.device)
+    rows = []
+    # img_scale is the outer loop since it needs a new dataset pipeline
+    for img_scale in grid['img_scale']:
+        set_img_scale(cfg, img_scale)
+        dataset, data_loader = build_test_loader(cfg)
+        # a new img_scale means new input shapes, so every scale is warmed up
+        warm_up(model, data_loader, args.warmup_batches)
+        for values in itertools.product(*(grid[name] for name, _ in SETTINGS[1:])):
+            settings = dict(img_scale=img_scale, **dict(zip([name for name, _ in SETTINGS[1:]], values)))
+            apply_settings(model, settings)
+            print(f'\nTrial {len(rows) + 1}: {settings}')
+            outputs, fps = run_test(model, data_loader)
+            results = evaluate_outputs(cfg, dataset, outputs)
+            row = dict(settings, fps=round(fps, 3), **{name: results.get(name) for name in metrics})
+            rows.append(row)
+            print(f'FPS {fps:.2f}, ' + ', '.join(f'{name} {row[name]}' for name in metrics))
+
+    front = pareto_front([row for row in rows if row[args.metric] is not None], args.metric)
+    for row in rows:
+        row['pareto'] = row in front
+    csv_path = osp.join(args.work_dir, 'sweep.csv')
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(osp.join(args.work_dir, 'pareto.json'), 'w') as f:
+        json.dump(dict(metric=args.metric, front=front), f, indent=2)
+
+    print(f'\nPareto front on FPS and {args.metric} ({len(front)} of {len(rows)} trials):')
+    for row in front:
+        print('  ' + ', '.join(f'{key}={row[key]}' for key in [name for name, _ in SETTINGS] + ['fps', args.metric]))
+    print(f'All trials written to {csv_path}')
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
 import argparse
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import mmcv
+import torch
+from torch.utils.data import Subset
 from mmdet.apis import set_random_seed
 from mmtrack.apis import init_model, single_gpu_test
 from mmtrack.datasets import build_dataset, build_dataloader
 from mmcv.parallel import MMDataParallel
+from det_cache import DetectionCache, build_det_cache, cache_path, replay_tracking
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Test a MOT model on a dataset.')
@@ -11,39 +19,134 @@ def parse_args():
     parser.add_argument('--detector-checkpoint', help='Path to the detector checkpoint', required=True)
     parser.add_argument('--reid-checkpoint', help='Path to the re-identification checkpoint', required=True)
     parser.add_argument('--work-dir', help='The dir to save logs and results', required=True)
+    parser.add_argument('--device', default='cuda:0', help='Device to use for computation.')
+    parser.add_argument('--workers', type=int, default=1, help='Evaluate the test videos in this many processes, each with its own model')
+    parser.add_argument('--det-cache', help='Directory caching detections and ReID embeddings; the tracker is replayed from it')
     return parser.parse_args()
 
-def main():
-    args = parse_args()
-    cfg = mmcv.Config.fromfile(args.config)
-    cfg.model.detector.init_cfg.checkpoint = args.detector_checkpoint
-    cfg.model.reid.init_cfg.checkpoint = args.reid_checkpoint
-    cfg.work_dir = args.work_dir
+def load_test_config(config, detector_checkpoint, reid_checkpoint, work_dir):
+    cfg = mmcv.Config.fromfile(config)
+    cfg.model.detector.init_cfg.checkpoint = detector_checkpoint
+    cfg.model.reid.init_cfg.checkpoint = reid_checkpoint
+    cfg.work_dir = work_dir
     cfg.seed = 0
     set_random_seed(0, deterministic=False)
     cfg.gpu_ids = range(1)
     cfg.data.test.test_mode = True
+    return cfg
 
-    print(f'Config:\n{cfg.pretty_text}')
-
+def build_test_loader(cfg, indices=None, workers_per_gpu=None):
+    # indices: optional subset of the test frames, e.g. the videos of one shard
     dataset = build_dataset(cfg.data.test)
     data_loader = build_dataloader(
-        dataset,
+        dataset if indices is None else Subset(dataset, indices),
         samples_per_gpu=1,
-        workers_per_gpu=cfg.data.workers_per_gpu,
+        workers_per_gpu=cfg.data.workers_per_gpu if workers_per_gpu is None else workers_per_gpu,
         dist=False,
         shuffle=False)
+    return dataset, data_loader
+
+def build_test_model(cfg, device='cuda:0'):
+    device = torch.device(device)
+    if device.type == 'cpu' and torch.cuda.is_available():
+        # DataParallel only skips scattering to a GPU when CUDA is unavailable
+        raise ValueError('Testing on the CPU needs the GPUs hidden, e.g. CUDA_VISIBLE_DEVICES= python tools/test.py ...')
+    model = init_model(cfg, device=str(device))
+    # the model's own device; without device ids MMDataParallel runs on the CPU
+    if device.type == 'cpu':
+        device_ids = []
+    else:
+        device_ids = [device.index if device.index is not None else torch.cuda.current_device()]
+    return MMDataParallel(model, device_ids=device_ids)
 
-    model = init_model(cfg)
-    model = MMDataParallel(model, device_ids=cfg.gpu_ids)
+def run_test(model, data_loader):
+    # Returns the outputs and the frames per second of the whole pass,
+    # data loading included.
+    start_time = time.perf_counter()
     outputs = single_gpu_test(model, data_loader)
+    elapsed = time.perf_counter() - start_time
+    return outputs, len(data_loader.dataset) / max(elapsed, 1e-9)
+
+def shard_videos(dataset, num_shards):
+    # Splits the test frames into num_shards lists of whole videos, balanced by
+    # frame count. Tracking state is per video, so shards are independent; the
+    # frames of each shard stay in dataset order.
+    videos = defaultdict(list)
+    for i, info in enumerate(dataset.data_infos):
+        videos[info['video_id']].append(i)
+    shards = [[] for _ in range(num_shards)]
+    for indices in sorted(videos.values(), key=len, reverse=True):
+        min(shards, key=len).extend(indices)
+    return [sorted(indices) for indices in shards if indices]
+
+def test_shard(args, indices, num_threads):
+    torch.set_num_threads(num_threads)
+    cfg = load_test_config(args.config, args.detector_checkpoint, args.reid_checkpoint, args.work_dir)
+    # the shards already run in parallel, so frames are loaded in-process
+    _, data_loader = build_test_loader(cfg, indices, workers_per_gpu=0)
+    model = build_test_model(cfg, args.device)
+    # only the test itself is timed, like in run_test()
+    start_time = time.perf_counter()
+    outputs = single_gpu_test(model, data_loader)
+    return indices, dict(outputs), time.perf_counter() - start_time
+
+def run_sharded_test(args, dataset, num_workers):
+    # Same outputs as run_test(), computed by one process per shard and merged
+    # back into dataset order. The shards test concurrently, so the FPS is
+    # measured against the slowest shard's test time; building the models and
+    # loading the checkpoints is not counted, as in run_test().
+    shards = shard_videos(dataset, num_workers)
+    num_threads = max(os.cpu_count() // len(shards), 1)
+    outputs = {}
+    elapsed = 0.0
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(test_shard, args, indices, num_threads) for indices in shards]
+        for future in as_completed(futures):
+            indices, shard_outputs, shard_elapsed = future.result()
+            elapsed = max(elapsed, shard_elapsed)
+            for key, values in shard_outputs.items():
+                merged = outputs.setdefault(key, [None] * len(dataset))
+                for i, value in zip(indices, values):
+                    merged[i] = value
+    return outputs, len(dataset) / max(elapsed, 1e-9)
 
+def run_cached_test(args, cfg, dataset, data_loader):
+    # The networks only run when the cache for these checkpoints and config
+    # does not exist yet; tracking always replays from the cache.
+    cache_dir = cache_path(args.det_cache, cfg, args.detector_checkpoint, args.reid_checkpoint)
+    if not DetectionCache.exists(cache_dir):
+        print(f'Building the detection cache in {cache_dir}')
+        build_det_cache(build_test_model(cfg, args.device), data_loader, cache_dir)
+    start_time = time.perf_counter()
+    outputs = replay_tracking(cfg, DetectionCache(cache_dir), dataset.data_infos)
+    elapsed = time.perf_counter() - start_time
+    return outputs, len(dataset) / max(elapsed, 1e-9)
+
+def evaluate_outputs(cfg, dataset, outputs):
     eval_kwargs = cfg.get('evaluation', {}).copy()
     for key in ['interval', 'tmpdir', 'start', 'gpu_collect', 'save_best', 'rule', 'by_epoch']:
         eval_kwargs.pop(key, None)
     eval_kwargs.update(dict(metric=['track']))
-    metric = dataset.evaluate(outputs, **eval_kwargs)
+    return dataset.evaluate(outputs, **eval_kwargs)
+
+def main():
+    args = parse_args()
+    cfg = load_test_config(args.config, args.detector_checkpoint, args.reid_checkpoint, args.work_dir)
+
+    print(f'Config:\n{cfg.pretty_text}')
+
+    dataset, data_loader = build_test_loader(cfg)
+    if args.det_cache:
+        outputs, fps = run_cached_test(args, cfg, dataset, data_loader)
+    elif args.workers > 1:
+        outputs, fps = run_sharded_test(args, dataset, args.workers)
+    else:
+        model = build_test_model(cfg, args.device)
+        outputs, fps = run_test(model, data_loader)
+
+    metric = evaluate_outputs(cfg, dataset, outputs)
     print(metric)
+    print(f'Inference speed: {fps:.2f} FPS')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,180 @@
+import os
+import queue
+import threading
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.png')
+VIDEO_EXTENSIONS = ('.mp4', '.avi')
+
+_END = object()
+
+
+# Decodes frames from a video file, camera id or image directory into a bounded
+# queue on a background thread. Iterating the reader yields (frame_index, frame).
+class FrameReader(threading.Thread):
+    def __init__(self, source, max_queue=8, drop_oldest=False):
+        super().__init__(daemon=True)
+        self.source = source
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Live cameras should never stall on a slow consumer: keep the newest frames.
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self.finished = False
+        self._stopped = threading.Event()
+        self._error = None
+        self._files = None
+        self._cap = None
+
+        if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+            self._cap = cv2.VideoCapture(int(source))
+        elif os.path.isdir(source):
+            self._files = sorted(
+                os.path.join(source, f) for f in os.listdir(source) if f.endswith(IMAGE_EXTENSIONS))
+        elif os.path.isfile(source) and source.endswith(VIDEO_EXTENSIONS):
+            self._cap = cv2.VideoCapture(source)
+        else:
+            raise ValueError("Input path must be a directory of images, a video file or a camera id.")
+
+        if self._cap is not None and not self._cap.isOpened():
+            raise IOError(f'Could not open video source: {source}')
+
+    @property
+    def num_frames(self):
+        if self._files is not None:
+            return len(self._files)
+        return max(int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+
+    @property
+    def fps(self):
+        if self._cap is None:
+            return None
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        return fps if fps > 0 else None
+
+    def _frames(self):
+        if self._files is not None:
+            for path in self._files:
+                yield cv2.imread(path)
+            return
+        while not self._stopped.is_set():
+            success, image = self._cap.read()
+            if not success:
+                break
+            yield image
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.drop_oldest and item is not _END:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def run(self):
+        try:
+            for index, frame in enumerate(self._frames()):
+                if self._stopped.is_set():
+                    break
+                self._put((index, frame))
+        except Exception as e:
+            self._error = e
+        finally:
+            if self._cap is not None:
+                self._cap.release()
+            self._put(_END)
+
+    def __iter__(self):
+        if self.ident is None:
+            self.start()
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def read(self, timeout=None):
+        # Returns the next (frame_index, frame), or None when no frame arrived
+        # within `timeout` seconds or the source is exhausted (see `finished`).
+        if self.ident is None:
+            self.start()
+        if self.finished:
+            return None
+        try:
+            item = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _END:
+            self.finished = True
+            if self._error is not None:
+                raise self._error
+            return None
+        return item
+
+    def stop(self):
+        self._stopped.set()
+        # Unblock the decoder if it is waiting on a full queue.
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+
+# Encodes frames to a video file on a background thread. The cv2.VideoWriter is
+# opened lazily from the size of the first frame.
+class FrameWriter(threading.Thread):
+    def __init__(self, output_path, fps=30, fourcc='mp4v', max_queue=8):
+        super().__init__(daemon=True)
+        self.output_path = output_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.frames_written = 0
+        self._error = None
+
+    def write(self, frame):
+        if self._error is not None:
+            raise self._error
+        if self.ident is None:
+            self.start()
+        self.queue.put(frame)
+
+    def run(self):
+        writer = None
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is _END:
+                    break
+                if writer is None:
+                    out_dir = os.path.dirname(os.path.abspath(self.output_path))
+                    os.makedirs(out_dir, exist_ok=True)
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(
+                        self.output_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+                writer.write(frame)
+                self.frames_written += 1
+        except Exception as e:
+            self._error = e
+            # Keep draining so producers never block on a dead writer.
+            while self.queue.get() is not _END:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def close(self):
+        if self.ident is None:
+            return
+        self.queue.put(_END)
+        self.join()
+        if self._error is not None:
+            raise self._error